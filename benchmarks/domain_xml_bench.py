@@ -0,0 +1,200 @@
+import sys
+import timeit
+from pathlib import Path
+from xml.dom import minidom
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.domain_xml import DOMAIN_DISKS, DOMAIN_INFO  # noqa: E402
+
+# trimmed `virsh dumpxml` of one of our Windows XP guests
+DOMAIN_XML = """<domain type='kvm' id='3'>
+  <name>upgrade-my-windows</name>
+  <uuid>1f7c1f2e-5d9a-4c0e-9b5f-2c7d3a6e8b41</uuid>
+  <metadata>
+    <libosinfo:libosinfo xmlns:libosinfo="http://libosinfo.org/xmlns/libvirt/domain/1.0">
+      <libosinfo:os id="http://microsoft.com/win/xp"/>
+    </libosinfo:libosinfo>
+  </metadata>
+  <memory unit='KiB'>524288</memory>
+  <currentMemory unit='KiB'>524288</currentMemory>
+  <vcpu placement='static'>1</vcpu>
+  <resource>
+    <partition>/machine</partition>
+  </resource>
+  <os>
+    <type arch='i686' machine='pc-i440fx-8.2'>hvm</type>
+    <boot dev='hd'/>
+    <boot dev='cdrom'/>
+    <boot dev='fd'/>
+  </os>
+  <features>
+    <acpi/>
+    <apic/>
+    <hyperv mode='custom'>
+      <relaxed state='on'/>
+      <vapic state='on'/>
+      <spinlocks state='on' retries='8191'/>
+    </hyperv>
+  </features>
+  <cpu mode='custom' match='exact' check='full'>
+    <model fallback='forbid'>qemu32</model>
+    <feature policy='require' name='hypervisor'/>
+  </cpu>
+  <clock offset='localtime'>
+    <timer name='rtc' tickpolicy='catchup'/>
+    <timer name='pit' tickpolicy='delay'/>
+    <timer name='hpet' present='no'/>
+    <timer name='hypervclock' present='yes'/>
+  </clock>
+  <on_poweroff>destroy</on_poweroff>
+  <on_reboot>restart</on_reboot>
+  <on_crash>destroy</on_crash>
+  <pm>
+    <suspend-to-mem enabled='no'/>
+    <suspend-to-disk enabled='no'/>
+  </pm>
+  <devices>
+    <emulator>/usr/bin/qemu-system-i386</emulator>
+    <disk type='file' device='disk'>
+      <driver name='qemu' type='qcow2' discard='unmap'/>
+      <source file='/var/lib/libvirt/images/upgrade-my-windows.qcow2' index='3'/>
+      <backingStore/>
+      <target dev='hda' bus='ide'/>
+      <alias name='ide0-0-0'/>
+      <address type='drive' controller='0' bus='0' target='0' unit='0'/>
+    </disk>
+    <disk type='file' device='cdrom'>
+      <driver name='qemu' type='raw'/>
+      <source file='/srv/umw/images/xp/first.iso' index='2'/>
+      <backingStore/>
+      <target dev='hdb' bus='ide'/>
+      <readonly/>
+      <alias name='ide0-0-1'/>
+      <address type='drive' controller='0' bus='0' target='0' unit='1'/>
+    </disk>
+    <disk type='file' device='floppy'>
+      <driver name='qemu' type='raw'/>
+      <source file='/srv/umw/images/xp/first.img' index='1'/>
+      <backingStore/>
+      <target dev='fda' bus='fdc'/>
+      <alias name='fdc0-0-0'/>
+      <address type='drive' controller='0' bus='0' target='0' unit='0'/>
+    </disk>
+    <controller type='usb' index='0' model='piix3-uhci'>
+      <alias name='usb'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x01' function='0x2'/>
+    </controller>
+    <controller type='pci' index='0' model='pci-root'>
+      <alias name='pci.0'/>
+    </controller>
+    <controller type='ide' index='0'>
+      <alias name='ide'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x01' function='0x1'/>
+    </controller>
+    <controller type='fdc' index='0'>
+      <alias name='fdc0'/>
+    </controller>
+    <interface type='network'>
+      <mac address='52:54:00:4b:1e:7a'/>
+      <source network='default' portid='0f6e5c5a-3f3b-4a5e-bb45-0c9f0b7f6a1d' bridge='virbr0'/>
+      <target dev='vnet2'/>
+      <model type='rtl8139'/>
+      <alias name='net0'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x03' function='0x0'/>
+    </interface>
+    <serial type='pty'>
+      <source path='/dev/pts/3'/>
+      <target type='isa-serial' port='0'>
+        <model name='isa-serial'/>
+      </target>
+      <alias name='serial0'/>
+    </serial>
+    <input type='tablet' bus='usb'>
+      <alias name='input0'/>
+      <address type='usb' bus='0' port='1'/>
+    </input>
+    <input type='mouse' bus='ps2'>
+      <alias name='input1'/>
+    </input>
+    <input type='keyboard' bus='ps2'>
+      <alias name='input2'/>
+    </input>
+    <graphics type='vnc' socket='/tmp/umw-vnc.sock'>
+      <listen type='socket' socket='/tmp/umw-vnc.sock'/>
+      <audio id='1'/>
+    </graphics>
+    <sound model='ac97'>
+      <audio id='1'/>
+      <alias name='sound0'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x04' function='0x0'/>
+    </sound>
+    <audio id='1' type='none'/>
+    <video>
+      <model type='cirrus' vram='16384' heads='1' primary='yes'/>
+      <alias name='video0'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x02' function='0x0'/>
+    </video>
+    <memballoon model='virtio'>
+      <alias name='balloon0'/>
+      <address type='pci' domain='0x0000' bus='0x00' slot='0x05' function='0x0'/>
+    </memballoon>
+  </devices>
+  <seclabel type='dynamic' model='dac' relabel='yes'>
+    <label>+64055:+994</label>
+    <imagelabel>+64055:+994</imagelabel>
+  </seclabel>
+</domain>
+"""
+
+
+def minidom_info(raw_xml: str) -> dict[str, str | None]:
+    # the parsing get_current_info used to do
+    xml = minidom.parseString(raw_xml)
+    os = xml.getElementsByTagName("libosinfo:os")[0].getAttribute("id")
+    cdrom_path = None
+    floppy = None
+    for disk in xml.getElementsByTagName("disk"):
+        if disk.getAttribute("device") == "cdrom" and cdrom_path is None:
+            if not disk.getElementsByTagName("source"):
+                continue
+            cdrom_path = disk.getElementsByTagName("source")[0].getAttribute("file")
+            continue
+        if disk.getAttribute("device") == "floppy" and floppy is None:
+            if not disk.getElementsByTagName("source"):
+                continue
+            floppy = disk.getElementsByTagName("source")[0].getAttribute("file")
+            continue
+        if cdrom_path and floppy:
+            break
+    return {"os": os, "cdrom": cdrom_path, "floppy": floppy}
+
+
+def minidom_disks(raw_xml: str) -> dict[str, str | None]:
+    # the parsing set_device used to do, for both device types
+    xml = minidom.parseString(raw_xml)
+    disks: dict[str, str | None] = {"cdrom": None, "floppy": None}
+    for disk in xml.getElementsByTagName("disk"):
+        device = disk.getAttribute("device")
+        if device in disks and disks[device] is None:
+            disks[device] = disk.toxml()
+    return disks
+
+
+def bench(name: str, func, number: int):
+    seconds = min(timeit.repeat(lambda: func(DOMAIN_XML), number=number, repeat=5))
+    print(f"{name:<24} {seconds / number * 1e6:9.1f} us/call")
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    assert DOMAIN_INFO.extract(DOMAIN_XML) == minidom_info(DOMAIN_XML)
+    print(f"{len(DOMAIN_XML)} bytes of domain XML, best of 5 x {number} calls")
+    bench("minidom info", minidom_info, number)
+    bench("extractor info", DOMAIN_INFO.extract, number)
+    bench("minidom disks", minidom_disks, number)
+    bench("extractor disks", DOMAIN_DISKS.extract, number)
+
+
+if __name__ == "__main__":
+    main()
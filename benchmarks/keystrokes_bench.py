@@ -0,0 +1,50 @@
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.keystrokes import compile_keystrokes  # noqa: E402
+
+# what people actually send with /type and /key
+TYPICAL = {
+    "ctrl-alt-del": "`ctrl-alt-del`",
+    "alt-f4": "`alt-f4`",
+    "run dialog": "`super_l-r`cmd\\n",
+    "sentence": "Hello from Discord! `enter`How are you doing today?\\n",
+}
+
+# inputs that make the lookbehind patterns and the escape decoder work hard
+ADVERSARIAL = {
+    "backslash run": "\\\\" * 500 + "`ctrl-c`",
+    "many combos": "`ctrl-c`" * 200,
+    "long combo": "`" + "-".join(["shift"] * 200) + "`",
+    "unclosed backtick": "`" + "a-" * 500,
+    "long text": "upgrade my windows " * 100,
+}
+
+
+def bench(name: str, text: str, number: int):
+    uncached = compile_keystrokes.__wrapped__
+    assert uncached(text) == compile_keystrokes(text)
+    parse = min(timeit.repeat(lambda: uncached(text), number=number, repeat=5))
+    cached = min(
+        timeit.repeat(lambda: compile_keystrokes(text), number=number, repeat=5)
+    )
+    print(
+        f"{name:<20} {len(text):6} chars "
+        f"{parse / number * 1e6:9.1f} us parse "
+        f"{cached / number * 1e6:7.2f} us cached"
+    )
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"best of 5 x {number} calls")
+    for name, text in {**TYPICAL, **ADVERSARIAL}.items():
+        bench(name, text, number)
+    print(compile_keystrokes.cache_info())
+
+
+if __name__ == "__main__":
+    main()
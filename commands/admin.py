@@ -26,11 +26,111 @@ class Admin(CogLogger):
     @handle_exception()
     async def reboot_command(self, interaction: discord.Interaction):
         self.logger.debug("VM reboot requested")
+        session = self.bot.get_session(interaction.channel_id)
+        if not session:
+            self.logger.warning("No VM for this channel")
+            await interaction.response.send_message("No VM in this channel.")
+            return
+
         await interaction.response.defer()
-        await self.bot.force_shutdown_domain()
-        await self.bot.start_domain()
+        await session.force_shutdown_domain()
+        await session.start_domain()
         await interaction.followup.send("Rebooted the VM.")
 
+    @app_commands.command(
+        name="stats",
+        description="Shows the bot's performance statistics.",
+    )
+    @is_me()
+    @handle_exception()
+    async def stats_command(self, interaction: discord.Interaction):
+        self.logger.debug("Stats requested")
+        session = self.bot.get_session(interaction.channel_id)
+        if not session:
+            self.logger.warning("No VM for this channel")
+            await interaction.response.send_message(
+                "No VM in this channel.", ephemeral=True
+            )
+            return
+
+        frame_stats = session.frame_stats
+        audio_stats = session.audio_stats
+        supervisor_stats = session.supervisor_stats
+        input_stats = session.input_stats
+        encoding_stats = sorted(
+            session.encoding_stats.items(),
+            key=lambda item: item[1]["decode_time"],
+            reverse=True,
+        )
+        libvirt_stats = sorted(
+            self.bot.libvirt_stats.items(),
+            key=lambda item: item[1]["total_time"],
+            reverse=True,
+        )[:5]
+        embed = discord.Embed(
+            title="Statistics",
+            description=f"Performance statistics of the bot and VM `{session.uuid}`.",
+            color=0x447DD2,
+        )
+        embed.add_field(
+            name="Frames",
+            value=f"{frame_stats['produced']} produced\n"
+            f"{frame_stats['displayed']} displayed\n"
+            f"{frame_stats['dropped']} dropped\n"
+            f"{frame_stats['render_time']:.1f}s rendering, "
+            f"{frame_stats['wait_time']:.1f}s waiting",
+            inline=True,
+        )
+        embed.add_field(
+            name="Audio",
+            value=f"{audio_stats['buffered']} chunks buffered\n"
+            f"{audio_stats['underruns']} underruns\n"
+            f"{audio_stats['overruns']} overruns\n"
+            f"{audio_stats['dropped_bytes']} bytes dropped",
+            inline=True,
+        )
+        embed.add_field(
+            name="Supervisor",
+            value=f"{supervisor_stats['restarts']} restarts\n"
+            f"{supervisor_stats['crash_loops']} crash loops\n"
+            f"last restart took {supervisor_stats['last_restart_time'] or 0:.2f}s\n"
+            f"average restart {supervisor_stats['average_restart_time'] or 0:.2f}s",
+            inline=True,
+        )
+        embed.add_field(
+            name="Input",
+            value=f"{input_stats['queued']} queued\n"
+            f"{input_stats['executed']} executed\n"
+            f"{input_stats['merged']} merged\n"
+            f"{input_stats['rejected']} rejected\n"
+            f"average wait {(input_stats['average_wait'] or 0) * 1000:.1f}ms\n"
+            f"max wait {input_stats['max_wait'] * 1000:.1f}ms",
+            inline=True,
+        )
+        embed.add_field(
+            name="Encodings",
+            value="\n".join(
+                f"`{name}` {stats['rects']} rects, "
+                f"{stats['bytes'] / 1024:.0f}KiB, "
+                f"{stats['decode_time'] * 1000:.0f}ms decoding"
+                for name, stats in encoding_stats
+            )
+            or "No updates yet",
+            inline=False,
+        )
+        embed.add_field(
+            name="libvirt",
+            value="\n".join(
+                f"`{name}` {stats['calls']}x, "
+                f"avg {stats['total_time'] / stats['calls'] * 1000:.1f}ms, "
+                f"max {stats['max_time'] * 1000:.1f}ms"
+                for name, stats in libvirt_stats
+            )
+            or "No calls yet",
+            inline=False,
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot))
@@ -32,7 +32,8 @@ class Change(CogLogger):
         os: str,
     ):
         self.logger.debug(f"Changing OS to {os} requested")
-        if not self.bot._is_vm_running:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vm_running:
             self.logger.warning("VM is not running")
             await interaction.response.send_message("VM is not running.")
             return
@@ -43,17 +44,21 @@ class Change(CogLogger):
             await interaction.response.send_message("OS not found.")
             return
 
-        await self.bot.set_vcpus(os_preset["vcpus"])
-        await self.bot.set_memory(os_preset["memory"])
-        await self.bot.set_os(os)
+        reconfiguration = (
+            session.reconfigure()
+            .set_vcpus(os_preset["vcpus"])
+            .set_memory(os_preset["memory"])
+            .set_os(os)
+        )
         if os_preset["cdrom"]:
-            await self.bot.set_device(os_preset["cdrom"][0])
+            reconfiguration.set_device(os_preset["cdrom"][0])
         else:
-            await self.bot.set_device()
+            reconfiguration.set_device()
         if os_preset["floppy"]:
-            await self.bot.set_device(os_preset["floppy"][0], "floppy")
+            reconfiguration.set_device(os_preset["floppy"][0], "floppy")
         else:
-            await self.bot.set_device(type="floppy")
+            reconfiguration.set_device(type="floppy")
+        await reconfiguration.commit()
 
         await interaction.response.send_message(
             "VM has been updated. Restart(or shut down) the VM to apply the cpu and memory changes."
@@ -81,8 +86,9 @@ class Change(CogLogger):
         image: str,
     ):
         self.logger.debug(f"Changing {type} image to {image} requested")
-        info = await self.bot.get_current_info()
-        if not self.bot._is_vm_running or not info:
+        session = self.bot.get_session(interaction.channel_id)
+        info = await session.get_current_info() if session else None
+        if not session or not session._is_vm_running or not info:
             self.logger.warning("VM is not running")
             await interaction.response.send_message("VM is not running.")
             return
@@ -105,10 +111,10 @@ class Change(CogLogger):
             return
         try:
             index = os_preset[type].index(image)  # type: ignore
-            await self.bot.set_device(os_preset[type][index], type)  # type: ignore
+            await session.set_device(os_preset[type][index], type)  # type: ignore
         except ValueError:
             if type == "cdrom" and image == "half-life.iso":
-                await self.bot.set_device(image, type)
+                await session.set_device(image, type)
             else:
                 self.logger.warning(f"Image {image} not found")
                 await interaction.response.send_message("Image not found.")
@@ -122,7 +128,8 @@ class Change(CogLogger):
         self, interaction: discord.Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
         self.logger.debug(f"Autocompletion for image {current} requested")
-        info = await self.bot.get_current_info()
+        session = self.bot.get_session(interaction.channel_id)
+        info = await session.get_current_info() if session else None
         if not info:
             return []
 
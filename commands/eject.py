@@ -22,17 +22,22 @@ class Eject(CogLogger):
         self, interaction: discord.Interaction, type: Literal["cdrom", "floppy", "both"]
     ):
         self.logger.debug(f"Ejecting {type} requested")
-        if not self.bot._is_vm_running:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vm_running:
             self.logger.warning("VM is not running")
             await interaction.response.send_message("VM is not running.")
             return
 
         if type == "both":
-            await self.bot.set_device(None)
-            await self.bot.set_device(None, "floppy")
+            await (
+                session.reconfigure()
+                .set_device(None)
+                .set_device(None, "floppy")
+                .commit()
+            )
             await interaction.response.send_message("Both devices have been ejected.")
         else:
-            await self.bot.set_device(None, type)
+            await session.set_device(None, type)
             await interaction.response.send_message("Device has been ejected.")
 
 
@@ -43,6 +43,11 @@ class Help(CogLogger):
             value="Takes a screenshot of the VM and sends it to you.",
             inline=True,
         )
+        embed.add_field(
+            name="`/watch start minutes: format:`",
+            value="Posts a live preview of the VM that keeps updating for everyone in the channel.",
+            inline=True,
+        )
         embed.add_field(
             name="`/info`",
             value="Shows the current VM information.",
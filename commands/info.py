@@ -9,16 +9,17 @@ class Info(CogLogger):
     @handle_exception()
     async def info_command(self, interaction: discord.Interaction):
         self.logger.debug("Info requested")
-        info = await self.bot.get_current_info()
-        if not info:
+        session = self.bot.get_session(interaction.channel_id)
+        info = await session.get_current_info() if session else None
+        if not session or not info:
             self.logger.warning("Failed to get VM info")
             await interaction.response.send_message("VM is not running.")
             return
 
         size = None
-        if self.bot._is_vnc_connected and self.bot.vnc.screen:
+        if session._is_vnc_connected and session.vnc.screen:
             self.logger.warning("Failed to get VM screen")
-            size = self.bot.vnc.screen.size
+            size = session.vnc.screen.size
         embed = discord.Embed(
             title="VM Information",
             description="Information about the current VM.",
@@ -3,6 +3,7 @@ import discord
 from discord import app_commands
 from utils.cog_logger import CogLogger
 from utils.handle_exception import handle_exception
+from utils.pointer_path import pointer_path
 
 
 MOUSE_BUTTONS = {"left": 1, "middle": 2, "right": 3}
@@ -14,6 +15,16 @@ WHEEL_BUTTONS = {
     "right": 7,
 }
 
+PATH_SHAPES = [
+    app_commands.Choice(name="Linear", value="linear"),
+    app_commands.Choice(name="Bezier", value="bezier"),
+]
+
+# relative pointer guests only resync after hitting the far corner, give them a
+# moment there before coming back to the origin. points are spread evenly over
+# the duration, so the corner gets half of it, 10ms like before
+RESET_DURATION = 0.02
+
 
 class Mouse(CogLogger):
     move_group = app_commands.Group(name="move", description="Moves the element.")
@@ -35,33 +46,49 @@ class Mouse(CogLogger):
         x="The X coordinate.",
         y="The Y coordinate.",
         relative="Whether the coordinates are relative to the current position.",
+        steps="How many intermediate moves to make on the way there.",
+        duration="How long the move takes, in seconds.",
+        shape="The shape of the path between the two points.",
     )
+    @app_commands.choices(shape=PATH_SHAPES)
     @handle_exception()
     async def move_xy_command(
-        self, interaction: discord.Interaction, x: int, y: int, relative: bool = False
+        self,
+        interaction: discord.Interaction,
+        x: int,
+        y: int,
+        relative: bool = False,
+        steps: app_commands.Range[int, 1, 200] = 1,
+        duration: app_commands.Range[float, 0, 5] = 0,
+        shape: str = "linear",
     ):
         self.logger.debug(f"Moving the mouse to {x}, {y} requested")
-        if not self.bot._is_vnc_connected or not self.bot.vnc.screen:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected or not session.vnc.screen:
             self.logger.warning("VNC is not connected or screen is not available")
             await interaction.response.send_message("VM is not running.")
             return
 
         await interaction.response.defer()
         if relative:
-            x += self.bot.vnc.x
-            y += self.bot.vnc.y
+            x += session.vnc.x
+            y += session.vnc.y
 
         if (
             x < -1
             or y < -1
-            or x > self.bot.vnc.screen.size[0]
-            or y > self.bot.vnc.screen.size[1]
+            or x > session.vnc.screen.size[0]
+            or y > session.vnc.screen.size[1]
         ):
             self.logger.debug("Request cancelled due to coordinates out of bounds")
             await interaction.followup.send("Coordinates are out of bounds.")
             return
 
-        self.bot.vnc.mouseMove(x, y)
+        if steps > 1:
+            path = pointer_path((session.vnc.x, session.vnc.y), (x, y), steps, shape)
+            await session.vnc.movePath(path, duration, user=interaction.user.id)
+        else:
+            await session.vnc.mouseMove(x, y, user=interaction.user.id)
 
         await interaction.followup.send(f"Moved the mouse cursor to {x}, {y}.")
 
@@ -72,16 +99,17 @@ class Mouse(CogLogger):
     @handle_exception()
     async def move_center_command(self, interaction: discord.Interaction):
         self.logger.debug("Moving mouse to center requested")
-        if not self.bot._is_vnc_connected or not self.bot.vnc.screen:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected or not session.vnc.screen:
             self.logger.warning("VNC is not connected or screen is not available")
             await interaction.response.send_message("VM is not running.")
             return
 
         await interaction.response.defer()
-        x = self.bot.vnc.screen.size[0] // 2
-        y = self.bot.vnc.screen.size[1] // 2
+        x = session.vnc.screen.size[0] // 2
+        y = session.vnc.screen.size[1] // 2
 
-        self.bot.vnc.mouseMove(x, y)
+        await session.vnc.mouseMove(x, y, user=interaction.user.id)
 
         await interaction.followup.send(f"Moved the mouse to the center of the screen.")
 
@@ -92,15 +120,18 @@ class Mouse(CogLogger):
     @handle_exception()
     async def reset_cursor_command(self, interaction: discord.Interaction):
         self.logger.debug("Resetting the mouse cursor requested")
-        if not self.bot._is_vnc_connected or not self.bot.vnc.screen:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected or not session.vnc.screen:
             self.logger.warning("VNC is not connected or screen is not available")
             await interaction.response.send_message("VM is not running.")
             return
 
         await interaction.response.defer()
-        self.bot.vnc.mouseMove(self.bot.vnc.screen.size[0], self.bot.vnc.screen.size[1])
-        await asyncio.sleep(0.01)
-        self.bot.vnc.mouseMove(0, 0)
+        await session.vnc.movePath(
+            (session.vnc.screen.size, (0, 0)),
+            RESET_DURATION,
+            user=interaction.user.id,
+        )
 
         await interaction.followup.send("Reset the mouse cursor.")
 
@@ -118,7 +149,8 @@ class Mouse(CogLogger):
         self, interaction: discord.Interaction, button: str = "left"
     ):
         self.logger.debug(f"Clicking the {button} button requested")
-        if not self.bot._is_vnc_connected:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected:
             self.logger.warning("VNC is not connected")
             await interaction.response.send_message("VM is not running.")
             return
@@ -130,9 +162,9 @@ class Mouse(CogLogger):
             return
 
         await interaction.response.defer()
-        self.bot.vnc.mouseDown(button_code)
+        await session.vnc.mouseDown(button_code, user=interaction.user.id)
         await asyncio.sleep(0.001)
-        self.bot.vnc.mouseUp(button_code)
+        await session.vnc.mouseUp(button_code, user=interaction.user.id)
 
         await interaction.followup.send("Clicked the mouse.")
 
@@ -153,7 +185,8 @@ class Mouse(CogLogger):
         self, interaction: discord.Interaction, direction: str = "up", amount: int = 1
     ):
         self.logger.debug(f"Scrolling the mouse {direction} requested")
-        if not self.bot._is_vnc_connected:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected:
             self.logger.warning("VNC is not connected")
             await interaction.response.send_message("VM is not running.")
             return
@@ -168,7 +201,7 @@ class Mouse(CogLogger):
 
         await interaction.response.defer()
         for _ in range(amount):
-            self.bot.vnc.mousePress(direction_code)
+            await session.vnc.mousePress(direction_code, user=interaction.user.id)
 
         await interaction.followup.send("Scrolled the mouse.")
 
@@ -188,7 +221,8 @@ class Mouse(CogLogger):
         self, interaction: discord.Interaction, button: str = "left"
     ):
         self.logger.debug(f"Pressing the {button} button requested")
-        if not self.bot._is_vnc_connected:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected:
             self.logger.warning("VNC is not connected")
             await interaction.response.send_message("VM is not running.")
             return
@@ -200,7 +234,7 @@ class Mouse(CogLogger):
             return
 
         await interaction.response.defer()
-        self.bot.vnc.mouseDown(button_code)
+        await session.vnc.mouseDown(button_code, user=interaction.user.id)
 
         await interaction.followup.send("Pressed the mouse button.")
 
@@ -218,7 +252,8 @@ class Mouse(CogLogger):
         self, interaction: discord.Interaction, button: str = "left"
     ):
         self.logger.debug(f"Depressing the {button} button requested")
-        if not self.bot._is_vnc_connected:
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected:
             self.logger.warning("VNC is not connected")
             await interaction.response.send_message("VM is not running.")
             return
@@ -230,10 +265,72 @@ class Mouse(CogLogger):
             return
 
         await interaction.response.defer()
-        self.bot.vnc.mouseUp(button_code)
+        await session.vnc.mouseUp(button_code, user=interaction.user.id)
 
         await interaction.followup.send("Depressed the mouse button.")
 
+    @mouse_group.command(
+        name="drag",
+        description="Drags the mouse to XY coordinates while holding a button.",
+    )
+    @app_commands.describe(
+        x="The X coordinate.",
+        y="The Y coordinate.",
+        button="The button to hold.",
+        steps="How many intermediate moves to make on the way there.",
+        duration="How long the drag takes, in seconds.",
+        shape="The shape of the path between the two points.",
+    )
+    @app_commands.choices(
+        button=[
+            app_commands.Choice(name="Left", value="left"),
+            app_commands.Choice(name="Middle", value="middle"),
+            app_commands.Choice(name="Right", value="right"),
+        ],
+        shape=PATH_SHAPES,
+    )
+    @handle_exception()
+    async def mouse_drag_command(
+        self,
+        interaction: discord.Interaction,
+        x: int,
+        y: int,
+        button: str = "left",
+        steps: app_commands.Range[int, 1, 200] = 20,
+        duration: app_commands.Range[float, 0, 5] = 0.5,
+        shape: str = "linear",
+    ):
+        self.logger.debug(f"Dragging the mouse to {x}, {y} requested")
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected or not session.vnc.screen:
+            self.logger.warning("VNC is not connected or screen is not available")
+            await interaction.response.send_message("VM is not running.")
+            return
+
+        button_code = MOUSE_BUTTONS.get(button.lower())
+        if not button_code:
+            self.logger.debug("Request cancelled due to requesting invalid button")
+            await interaction.response.send_message("Invalid button.")
+            return
+
+        if (
+            x < 0
+            or y < 0
+            or x > session.vnc.screen.size[0]
+            or y > session.vnc.screen.size[1]
+        ):
+            self.logger.debug("Request cancelled due to coordinates out of bounds")
+            await interaction.response.send_message("Coordinates are out of bounds.")
+            return
+
+        await interaction.response.defer()
+        path = pointer_path((session.vnc.x, session.vnc.y), (x, y), steps, shape)
+        await session.vnc.movePath(
+            path, duration, button_code, user=interaction.user.id
+        )
+
+        await interaction.followup.send(f"Dragged the mouse to {x}, {y}.")
+
 
 async def setup(bot):
     await bot.add_cog(Mouse(bot))
@@ -3,6 +3,7 @@ import io
 from discord import app_commands
 from utils.cog_logger import CogLogger
 from utils.handle_exception import handle_exception
+from utils.screenshot_service import DEFAULT_UPLOAD_LIMIT, EXTENSIONS, Encoding
 
 
 class Screenshot(CogLogger):
@@ -10,20 +11,65 @@ class Screenshot(CogLogger):
         name="screenshot",
         description="Takes a screenshot of the VM and sends it to you.",
     )
+    @app_commands.describe(
+        format="The image format. By default the cheapest one that can be uploaded is used.",
+        compress_level="PNG compression level, from 0 (fastest) to 9 (smallest).",
+        quality="WebP and JPEG quality, from 1 (smallest) to 100 (best).",
+    )
+    @app_commands.choices(
+        format=[
+            app_commands.Choice(name="Auto", value="auto"),
+            app_commands.Choice(name="PNG", value="png"),
+            app_commands.Choice(name="WebP", value="webp"),
+            app_commands.Choice(name="JPEG", value="jpeg"),
+        ]
+    )
     @handle_exception()
-    async def screenshot_command(self, interaction: discord.Interaction):
-        self.logger.debug("Screenshot requested")
-        img = await self.bot.get_screen_img()
-        if not img:
-            self.logger.warning("Failed to get VM screen")
+    async def screenshot_command(
+        self,
+        interaction: discord.Interaction,
+        format: str = "auto",
+        compress_level: app_commands.Range[int, 0, 9] = 6,
+        quality: app_commands.Range[int, 1, 100] = 85,
+    ):
+        self.logger.debug(f"Screenshot as {format} requested")
+        session = self.bot.get_session(interaction.channel_id)
+        if not session or not session._is_vnc_connected:
+            self.logger.warning("VNC is not connected")
             await interaction.response.send_message("VM is not running.")
             return
 
-        with io.BytesIO() as image_binary:
-            img.save(image_binary, format="PNG")
-            image_binary.seek(0)
-            await interaction.response.send_message(
-                file=discord.File(image_binary, filename="screenshot.png")
+        encoding = None
+        if format == "png":
+            encoding = Encoding("png", (("compress_level", compress_level),))
+        elif format == "webp" or format == "jpeg":
+            encoding = Encoding(format, (("quality", quality),))
+        limit = (
+            interaction.guild.filesize_limit
+            if interaction.guild
+            else DEFAULT_UPLOAD_LIMIT
+        )
+
+        await interaction.response.defer()
+        result = await session.screenshots.get(encoding, limit)
+        if not result:
+            self.logger.warning("Failed to get VM screen")
+            await interaction.followup.send("VM is not running.")
+            return
+
+        data, encoding = result
+        if len(data) > limit:
+            self.logger.warning(f"Screenshot is too large ({len(data)} bytes)")
+            await interaction.followup.send(
+                "Screenshot is too large to upload. Try another format."
+            )
+            return
+
+        with io.BytesIO(data) as image_binary:
+            await interaction.followup.send(
+                file=discord.File(
+                    image_binary, filename=f"screenshot.{EXTENSIONS[encoding.format]}"
+                )
             )
 
 
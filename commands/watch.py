@@ -0,0 +1,88 @@
+import discord
+from discord import app_commands
+from utils.cog_logger import CogLogger
+from utils.handle_exception import handle_exception
+from utils.live_preview import LivePreview
+
+
+class Watch(CogLogger):
+    watch_group = app_commands.Group(
+        name="watch", description="Streams the VM screen to this channel."
+    )
+
+    @watch_group.command(
+        name="start",
+        description="Posts a live preview of the VM screen that keeps updating.",
+    )
+    @app_commands.describe(
+        minutes="How long the preview keeps updating.",
+        format="The format of the preview clips.",
+    )
+    @app_commands.choices(
+        format=[
+            app_commands.Choice(name="WebP", value="webp"),
+            app_commands.Choice(name="GIF", value="gif"),
+        ]
+    )
+    @handle_exception()
+    async def watch_start_command(
+        self,
+        interaction: discord.Interaction,
+        minutes: app_commands.Range[int, 1, 30] = 5,
+        format: str = "webp",
+    ):
+        self.logger.debug(f"Live preview for {minutes} minutes requested")
+        session = self.bot.get_session(interaction.channel_id)
+        if (
+            not session
+            or not session._is_vnc_connected
+            or interaction.channel_id is None
+            or not isinstance(interaction.channel, discord.abc.Messageable)
+        ):
+            self.logger.warning("VNC is not connected")
+            await interaction.response.send_message("VM is not running.")
+            return
+
+        # everyone in the channel shares the same preview
+        preview = session.previews.get(interaction.channel_id)
+        if preview and preview.running:
+            preview.extend(minutes * 60)
+            await interaction.response.send_message(
+                f"The preview is already live here, it keeps going for at least {minutes} more minutes."
+            )
+            return
+
+        preview = LivePreview(
+            session,
+            interaction.channel,
+            "gif" if format == "gif" else "webp",
+            minutes * 60,
+        )
+        session.previews[interaction.channel_id] = preview
+        preview.start()
+        await interaction.response.send_message(
+            f"Live preview started for {minutes} minutes."
+        )
+
+    @watch_group.command(
+        name="stop", description="Stops the live preview in this channel."
+    )
+    @handle_exception()
+    async def watch_stop_command(self, interaction: discord.Interaction):
+        self.logger.debug("Stopping live preview requested")
+        session = self.bot.get_session(interaction.channel_id)
+        preview = (
+            session.previews.get(interaction.channel_id)
+            if session and interaction.channel_id is not None
+            else None
+        )
+        if not preview or not preview.running:
+            await interaction.response.send_message("No live preview in this channel.")
+            return
+
+        preview.stop()
+        await interaction.response.send_message("Live preview stopped.")
+
+
+async def setup(bot):
+    await bot.add_cog(Watch(bot))
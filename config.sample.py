@@ -1,4 +1,5 @@
 from os_preset import OSPreset
+from typings.domain_config import DomainConfig
 
 
 os_list: list[OSPreset] = [
@@ -8,5 +9,18 @@ os_list: list[OSPreset] = [
         "cdrom": ["first.iso", "second.iso"],  # CD-ROM images
         "floppy": ["first.img", "second.img"],  # Floppy images
         "os": "1.0",  # Windows version name (e.g. 1.0, 2.0, 3.0, 3.1, 95, 98, 2000, XP, Vista, 7, 8, 8.1, 10)
+        # Optional, for guests that drop keys when typing too fast
+        "type_delay": 0.02,  # Seconds to wait between keystroke batches
+        "type_batch": 2,  # Key events sent per batch
+        "pixel_format": "bgr233",  # Optional, VNC pixel format (bgr233, rgb565 or rgb888)
     }
 ]
+
+# Optional, leave empty to drive VIRT_DOMAIN_UUID from every channel, e.g.
+# {
+#     "uuid": "LIBVIRT REGISTERED DOMAIN UUID",
+#     "channels": [123456789012345678],  # Discord channel IDs that control this VM
+#     "vnc_socket": "/tmp/umw-vnc.sock",  # Optional, read from the domain XML by default
+#     "display": True,  # Optional, show the local display window (one domain at most)
+# }
+domains: list[DomainConfig] = []
@@ -4,15 +4,24 @@ import discord
 import libvirt
 import os
 from pathlib import Path
-from PIL import Image
 from discord.ext import commands
-from xml.dom import minidom
 from dotenv import load_dotenv
-from typing import Literal
-from typings.vminfo import VMInfo
-from utils.display_window import DisplayWindow
+from typings.domain_config import DomainConfig
+from typings.libvirt_call_stats import LibvirtCallStats
+from utils.audio_buffer import FLUSH_MS, ms_to_bytes
+from utils.audio_sink import JITTER_CHUNKS
+from utils.frame_server import FrameServer
+from utils.libvirt_events import start_event_loop
+from utils.libvirt_worker import LibvirtWorker
 from utils.logger import get_logger
-from utils.vnc_client import VNCClient
+from utils.vm_session import VMSession
+from utils.vnc_client import FPS
+from utils.vnc_encodings import DEFAULT_ENCODINGS, parse_encodings
+
+try:
+    from config import domains
+except ImportError:
+    domains: list[DomainConfig] = []
 
 COMMANDS = [
     "admin",
@@ -23,44 +32,87 @@ COMMANDS = [
     "info",
     "keyboard",
     "screenshot",
+    "watch",
 ]
 
 load_dotenv()
 
 
 class UpgradeMyWindowsBot(commands.Bot):
-    virt: libvirt.virConnect
-    dom: libvirt.virDomain
-    vnc: VNCClient
+    virt_worker: LibvirtWorker
+    virt: libvirt.virConnect | None
+    sessions: list[VMSession]
+    channel_sessions: dict[int, VMSession]
+    default_session: VMSession | None
+    frame_server: FrameServer | None
     image_path: Path
-    display_window: DisplayWindow
-    vm_loop: asyncio.Task | None
-    audio_buffer: bytes
+    fps: int
+    vnc_encodings: list[str]
+    audio_flush_ms: int
+    audio_flush_size: int
+    audio_jitter_chunks: int
     logger: logging.Logger
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.display_window = DisplayWindow()
-        self.display_window.start()
-        self.virt = libvirt.open()
-        self.dom = self.virt.lookupByUUIDString(os.getenv("VIRT_DOMAIN_UUID"))
-        self.vnc = VNCClient()  # dummy
-        self.vm_loop = None
+        self.fps = int(os.getenv("VNC_FPS") or FPS)
+        self.vnc_encodings = (
+            parse_encodings(os.getenv("VNC_ENCODINGS") or "") or DEFAULT_ENCODINGS
+        )
+        self.audio_flush_ms = int(os.getenv("AUDIO_FLUSH_MS") or FLUSH_MS)
+        self.audio_flush_size = ms_to_bytes(self.audio_flush_ms)
+        audio_jitter_ms = int(
+            os.getenv("AUDIO_JITTER_MS") or self.audio_flush_ms * JITTER_CHUNKS
+        )
+        self.audio_jitter_chunks = max(1, audio_jitter_ms // self.audio_flush_ms)
+        start_event_loop()
+        self.virt_worker = LibvirtWorker()
+        self.virt = None
         self.image_path = Path(os.getenv("IMAGE_PATH") or "./images")
-        self.audio_buffer = b""
         self.logger = get_logger(self.__class__.__name__)
+        self.frame_server = None
+
+        self.sessions = []
+        self.channel_sessions = {}
+        self.default_session = None
+        # without a domain list, drive VIRT_DOMAIN_UUID from every channel
+        configs = domains or [
+            {
+                "uuid": os.getenv("VIRT_DOMAIN_UUID") or "",
+                "channels": [],
+                "display": (os.getenv("DISPLAY_WINDOW") or "1") != "0",
+            }
+        ]
+        has_display = False
+        for config in configs:
+            display = config.get("display", False)
+            if display and has_display:
+                # OpenCV and the pygame mixer are process wide
+                self.logger.warning(
+                    f"Only one domain can have the display window, "
+                    f"not showing {config['uuid']}"
+                )
+                display = False
+            has_display = has_display or display
+            session = VMSession(self, config, display)
+            self.sessions.append(session)
+            for channel in config["channels"]:
+                self.channel_sessions[channel] = session
+            if not config["channels"] and not self.default_session:
+                self.default_session = session
 
     @property
     def _is_virt_connected(self) -> bool:
-        return self.virt.isAlive()
+        return self.virt_worker.connected
 
     @property
-    def _is_vm_running(self) -> bool:
-        return self._is_virt_connected and self.dom.isActive() == 1
+    def libvirt_stats(self) -> dict[str, LibvirtCallStats]:
+        return self.virt_worker.stats
 
-    @property
-    def _is_vnc_connected(self) -> bool:
-        return self.vnc.is_alive() and self.vnc.is_connected
+    def get_session(self, channel_id: int | None) -> VMSession | None:
+        if channel_id is None:
+            return self.default_session
+        return self.channel_sessions.get(channel_id, self.default_session)
 
     async def connect_qemu(self, reconnect=False):
         self.logger.info("Connecting to QEMU")
@@ -73,100 +125,32 @@ class UpgradeMyWindowsBot(commands.Bot):
                     "Already connected to QEMU, ignoring connection request"
                 )
                 return
-        self.virt = libvirt.open()
-        self.dom = self.virt.lookupByUUIDString(os.getenv("VIRT_DOMAIN_UUID"))
+        # one connection and one worker thread for every domain
+        self.virt = await self.virt_worker.open()
+        for session in self.sessions:
+            await session.attach(self.virt)
         self.logger.info("Connected to QEMU")
 
-    async def vm_start_loop(self):
-        self.logger.info("VM start loop started")
-        while self._is_virt_connected:
-            await asyncio.sleep(1)
-            if not self._is_vm_running:
-                await self.start_domain()
-                await self.connect_vnc(reconnect=True)
-        self.logger.info("VM start loop stopped")
-
-    async def connect_vnc(self, reconnect=False):
-        self.logger.info("Connecting to VNC")
-        if self._is_vnc_connected:
-            if reconnect:
-                self.logger.debug("Disconnecting from VNC for reconnection")
-                await self.disconnect_vnc()
-            else:
-                self.logger.warning(
-                    "Already connected to VNC, ignoring connection request"
-                )
-                return
-        self.vnc = VNCClient()
-        self.vnc.add_event_listener("screen_update", self._on_screen_update)
-        self.vnc.add_event_listener("ready", self._on_vnc_ready)
-        self.vnc.add_event_listener("audio_data", self._on_audio_data)
-        self.vnc.start()
-        self.logger.info("Connected to VNC")
-
-    async def _on_screen_update(self, image: Image.Image | None):
-        if image:
-            self.display_window.update_frame(image)
-
-    async def _on_vnc_ready(self):
-        if self._is_vnc_connected:
-            self.logger.info("VNC is ready")
-            self.vnc.audioStreamBeginRequest()
-
-    async def _on_audio_data(self, size: int, data: bytes):
-        if len(self.audio_buffer) < 44100 * 2 * 2:
-            self.audio_buffer += data
-        else:
-            if self._is_vnc_connected and self.display_window.running:
-                self.display_window.update_audio(self.audio_buffer)
-            self.audio_buffer = b""
-
-    async def disconnect_vnc(self):
-        self.logger.info("Disconnecting from VNC")
-        if self._is_vnc_connected:
-            self.vnc.remove_event_listener("screen_update")
-            self.vnc.remove_event_listener("ready")
-            self.vnc.remove_event_listener("audio_data")
-            self.vnc.disconnect()
-        self.logger.info("Disconnected from VNC")
-
-    async def shutdown_domain(self):
-        self.logger.info("Shutting down VM")
-        if self._is_vm_running:
-            await self.disconnect_vnc()
-            self.dom.shutdown()
-        self.logger.info("VM is shut down")
-
-    async def start_domain(self):
-        self.logger.info("Starting VM")
-        if not self._is_vm_running:
-            self.dom.create()
-            await self.connect_vnc(reconnect=True)
-        self.logger.info("VM is started")
-
-    async def force_shutdown_domain(self):
-        self.logger.info("Force shutting down VM")
-        if self._is_vm_running:
-            await self.disconnect_vnc()
-            self.dom.destroy()
-        self.logger.info("VM is force shut down")
-
     async def disconnect_qemu(self):
         self.logger.info("Disconnecting from QEMU")
-        if self._is_vnc_connected:
-            await self.disconnect_vnc()
-        if self.vm_loop:
-            self.vm_loop.cancel()
-            self.vm_loop = None
-        if self.virt:
-            self.virt.close()
+        for session in self.sessions:
+            await session.detach()
+        await self.virt_worker.close()
+        self.virt = None
         self.logger.info("Disconnected from QEMU")
 
     async def setup_hook(self):
         self.logger.info("Doing initial setup")
+        frame_server_port = os.getenv("FRAME_SERVER_PORT")
+        if frame_server_port:
+            try:
+                self.frame_server = FrameServer(self, int(frame_server_port))
+                await self.frame_server.start()
+            except RuntimeError as e:
+                self.logger.warning(f"Frame server disabled: {e}")
+                self.frame_server = None
         await self.connect_qemu()
-        await self.start_domain()
-        await self.connect_vnc()
+        await asyncio.gather(*(session.start() for session in self.sessions))
 
     async def on_ready(self):
         self.logger.info(f"Logged on as {self.user}!")
@@ -177,137 +161,14 @@ class UpgradeMyWindowsBot(commands.Bot):
         self.logger.info("Closing bot")
         if self._closed:
             return
-        self.display_window.close()
-        self.display_window.join()
+        for session in self.sessions:
+            session.close()
+        if self.frame_server:
+            await self.frame_server.close()
         await self.disconnect_qemu()
+        self.virt_worker.shutdown()
         await super().close()
 
-    async def get_screen_img(self) -> Image.Image | None:
-        self.logger.debug("Getting screen image")
-        if not self._is_vnc_connected:
-            self.logger.warning("VNC is not connected")
-            return None
-
-        return self.vnc.screen
-
-    async def set_vcpus(self, vcpus: int):
-        self.logger.info(f"Setting vCPUs to {vcpus}")
-        if self._is_virt_connected:
-            self.dom.setVcpusFlags(vcpus, libvirt.VIR_DOMAIN_AFFECT_CONFIG)
-
-    async def set_memory(self, memory: int):
-        self.logger.info(f"Setting memory to {memory} KB")
-        if self._is_virt_connected:
-            self.dom.setMemoryFlags(
-                memory,
-                libvirt.VIR_DOMAIN_AFFECT_CONFIG | libvirt.VIR_DOMAIN_MEM_MAXIMUM,
-            )
-            self.dom.setMemoryFlags(memory, libvirt.VIR_DOMAIN_AFFECT_CONFIG)
-
-    async def set_device(
-        self, path: str | None = None, type: Literal["cdrom", "floppy"] = "cdrom"
-    ):
-        self.logger.info(f"Setting {type} to {path}")
-        if self._is_vm_running:
-            info = await self.get_current_info()
-            if not info:
-                self.logger.warning("Failed to get VM info")
-                return
-            if path:
-                if path == "half-life.iso":
-                    path = str(self.image_path / path)
-                else:
-                    path = str(self.image_path / info["os"] / path)
-            else:
-                path = None
-            raw_xml = self.dom.XMLDesc()
-            xml = minidom.parseString(raw_xml)
-            disks = xml.getElementsByTagName("disk")
-            for disk in disks:
-                if disk.getAttribute("device") == type:
-                    if not disk.getElementsByTagName("source"):
-                        disk.appendChild(xml.createElement("source"))
-                    disk.getElementsByTagName("source")[0].setAttribute(
-                        "file", path or ""
-                    )
-                    self.dom.updateDeviceFlags(
-                        disk.toxml("utf8").decode(),
-                        libvirt.VIR_DOMAIN_AFFECT_CURRENT
-                        | libvirt.VIR_DOMAIN_AFFECT_LIVE
-                        | libvirt.VIR_DOMAIN_AFFECT_CONFIG,
-                    )
-                    break
-
-    async def set_os(self, os: str):
-        self.logger.info(f"Setting OS to {os}")
-        if self._is_vm_running:
-            raw_xml = self.dom.metadata(
-                libvirt.VIR_DOMAIN_METADATA_ELEMENT,
-                "http://libosinfo.org/xmlns/libvirt/domain/1.0",
-            )
-            xml = minidom.parseString(raw_xml)
-            osinfo = xml.getElementsByTagName("os")[0]
-            osinfo.setAttribute("id", f"http://microsoft.com/win/{os.lower()}")
-            self.dom.setMetadata(
-                libvirt.VIR_DOMAIN_METADATA_ELEMENT,
-                xml.toxml("utf8").decode(),
-                "libosinfo",
-                "http://libosinfo.org/xmlns/libvirt/domain/1.0",
-                libvirt.VIR_DOMAIN_AFFECT_CURRENT
-                | libvirt.VIR_DOMAIN_AFFECT_LIVE
-                | libvirt.VIR_DOMAIN_AFFECT_CONFIG,
-            )
-
-    async def get_current_info(self) -> VMInfo | None:
-        self.logger.debug("Getting current VM info")
-        if self._is_vm_running:
-            memsize = self.dom.maxMemory()
-            vcpus = self.dom.vcpusFlags()
-
-            raw_xml = self.dom.XMLDesc()
-            xml = minidom.parseString(raw_xml)
-            os = (
-                xml.getElementsByTagName("libosinfo:os")[0]
-                .getAttribute("id")
-                .split("/")[-1]
-            )
-            disks = xml.getElementsByTagName("disk")
-            cdrom_path = None
-            floppy = None
-            for disk in disks:
-                if disk.getAttribute("device") == "cdrom" and cdrom_path is None:
-                    if not disk.getElementsByTagName("source"):
-                        continue
-                    cdrom_path = (
-                        disk.getElementsByTagName("source")[0]
-                        .getAttribute("file")
-                        .split("/")[-1]
-                    )
-                    continue
-                if disk.getAttribute("device") == "floppy" and floppy is None:
-                    if not disk.getElementsByTagName("source"):
-                        continue
-                    floppy = (
-                        disk.getElementsByTagName("source")[0]
-                        .getAttribute("file")
-                        .split("/")[-1]
-                    )
-                    continue
-                if cdrom_path and floppy:
-                    break
-
-            info: VMInfo = {
-                "memory": memsize / 1024,
-                "cpu": vcpus,
-                "cdrom": cdrom_path,
-                "floppy": floppy,
-                "os": os,
-            }
-            self.logger.debug(f"Current VM info: {info}")
-            return info
-        else:
-            return None
-
 
 intents = discord.Intents.default()
 client = UpgradeMyWindowsBot("aaaaaaaaaaaaaaaaa", intents=intents)
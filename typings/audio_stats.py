@@ -0,0 +1,8 @@
+from typing import TypedDict
+
+
+class AudioStats(TypedDict):
+    buffered: int
+    underruns: int
+    overruns: int
+    dropped_bytes: int
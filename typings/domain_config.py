@@ -0,0 +1,11 @@
+from typing import NotRequired, TypedDict
+
+
+class DomainConfig(TypedDict):
+    uuid: str
+    # channels whose commands drive this domain
+    channels: list[int]
+    # defaults to the VNC unix socket in the domain XML
+    vnc_socket: NotRequired[str]
+    # only one domain can have the local display window
+    display: NotRequired[bool]
@@ -0,0 +1,7 @@
+from typing import TypedDict
+
+
+class EncodingStats(TypedDict):
+    rects: int
+    bytes: int
+    decode_time: float
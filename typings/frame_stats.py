@@ -0,0 +1,9 @@
+from typing import TypedDict
+
+
+class FrameStats(TypedDict):
+    produced: int
+    displayed: int
+    dropped: int
+    render_time: float
+    wait_time: float
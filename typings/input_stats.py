@@ -0,0 +1,10 @@
+from typing import TypedDict
+
+
+class InputStats(TypedDict):
+    queued: int
+    executed: int
+    merged: int
+    rejected: int
+    average_wait: float | None
+    max_wait: float
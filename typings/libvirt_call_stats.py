@@ -0,0 +1,7 @@
+from typing import TypedDict
+
+
+class LibvirtCallStats(TypedDict):
+    calls: int
+    total_time: float
+    max_time: float
@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Literal, NotRequired, TypedDict
 
 
 class OSPreset(TypedDict):
@@ -7,3 +7,8 @@ class OSPreset(TypedDict):
     cdrom: list[str] | None
     floppy: list[str] | None
     os: str
+    # keystroke pacing for /type, see commands/keyboard.py for the defaults
+    type_delay: NotRequired[float]
+    type_batch: NotRequired[int]
+    # smaller pixel formats for guests that can't show more colors anyway
+    pixel_format: NotRequired[Literal["bgr233", "rgb565", "rgb888"]]
@@ -0,0 +1,10 @@
+from typing import TypedDict
+
+
+class StreamClientStats(TypedDict):
+    kind: str
+    connected_time: float
+    bytes_sent: int
+    messages_sent: int
+    dropped: int
+    bandwidth: float
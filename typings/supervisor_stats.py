@@ -0,0 +1,8 @@
+from typing import TypedDict
+
+
+class SupervisorStats(TypedDict):
+    restarts: int
+    crash_loops: int
+    last_restart_time: float | None
+    average_restart_time: float | None
@@ -0,0 +1,66 @@
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+FLUSH_MS = 50
+CAPACITY_MS = 1000
+
+
+def ms_to_bytes(ms: int) -> int:
+    # always a whole number of frames so channels never get swapped
+    return SAMPLE_RATE * ms // 1000 * CHANNELS * SAMPLE_WIDTH
+
+
+class PCMRingBuffer:
+    buffer: bytearray
+    view: memoryview
+    capacity: int
+    start: int
+    size: int
+    dropped: int
+
+    def __init__(self, capacity: int):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def write(self, data: bytes):
+        data_view = memoryview(data)
+        if len(data_view) > self.capacity:
+            self.dropped += len(data_view) - self.capacity
+            data_view = data_view[-self.capacity :]
+
+        # the consumer fell behind, throw away the oldest audio
+        overflow = self.size + len(data_view) - self.capacity
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.capacity
+            self.size -= overflow
+            self.dropped += overflow
+
+        end = (self.start + self.size) % self.capacity
+        first = min(len(data_view), self.capacity - end)
+        self.view[end : end + first] = data_view[:first]
+        self.view[: len(data_view) - first] = data_view[first:]
+        self.size += len(data_view)
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self.size)
+        first = min(size, self.capacity - self.start)
+        data = b"".join(
+            (
+                self.view[self.start : self.start + first],
+                self.view[: size - first],
+            )
+        )
+        self.start = (self.start + size) % self.capacity
+        self.size -= size
+        return data
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
@@ -0,0 +1,87 @@
+import numpy as np
+import pygame
+from collections import deque
+from utils.audio_buffer import CHANNELS
+
+# one sound playing, one queued on the channel and one being filled
+POOL_SIZE = 3
+JITTER_CHUNKS = 2
+
+
+class AudioSink:
+    chunks: deque[bytes]
+    chunk_size: int
+    jitter_chunks: int
+    max_chunks: int
+    underruns: int
+    overruns: int
+    buffering: bool
+    channel: pygame.mixer.Channel | None
+    sounds: list[pygame.mixer.Sound]
+    samples: list[np.ndarray]
+    next_sound: int
+
+    def __init__(
+        self,
+        chunk_size: int,
+        jitter_chunks: int = JITTER_CHUNKS,
+        max_chunks: int | None = None,
+    ):
+        self.chunks = deque()
+        self.chunk_size = chunk_size
+        self.jitter_chunks = jitter_chunks
+        self.max_chunks = max_chunks or jitter_chunks * 4
+        self.underruns = 0
+        self.overruns = 0
+        self.buffering = True
+        self.channel = None
+        self.sounds = []
+        self.samples = []
+        self.next_sound = 0
+
+    def open(self):
+        # needs an initialized mixer, so this runs on the display thread
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        for _ in range(POOL_SIZE):
+            sound = pygame.mixer.Sound(buffer=bytes(self.chunk_size))
+            self.sounds.append(sound)
+            self.samples.append(pygame.sndarray.samples(sound))
+
+    def write(self, data: bytes):
+        if len(self.chunks) >= self.max_chunks:
+            # playback can't keep up, skip ahead instead of adding latency
+            self.chunks.popleft()
+            self.overruns += 1
+        self.chunks.append(data)
+
+    def pump(self):
+        if self.channel is None:
+            return
+        if self.buffering:
+            if len(self.chunks) < self.jitter_chunks:
+                return
+            self.buffering = False
+
+        while self.channel.get_queue() is None:
+            if not self.chunks:
+                if not self.channel.get_busy():
+                    # ran dry, fill the jitter buffer again before resuming
+                    self.underruns += 1
+                    self.buffering = True
+                return
+            self.channel.queue(self._load(self.chunks.popleft()))
+
+    def _load(self, data: bytes) -> pygame.mixer.Sound:
+        if len(data) != self.chunk_size:
+            return pygame.mixer.Sound(buffer=data)
+        index = self.next_sound
+        self.next_sound = (index + 1) % POOL_SIZE
+        samples = self.samples[index]
+        samples[:] = np.frombuffer(data, dtype=samples.dtype).reshape(-1, CHANNELS)
+        return self.sounds[index]
+
+    def close(self):
+        if self.channel is not None:
+            self.channel.stop()
+        self.chunks.clear()
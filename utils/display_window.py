@@ -1,39 +1,93 @@
 import cv2
 import pygame
 import threading
-import queue
-import numpy as np
-from PIL import Image
+import time
+from typings.frame_stats import FrameStats
+from utils.audio_buffer import CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH
+from utils.audio_sink import AudioSink
+from utils.frame_slot import FrameSlot
+from utils.framebuffer import Framebuffer
 from utils.logger import get_logger
+from utils.vnc_client import FPS
+
+
+TITLE = "Upgrade My Windows"
+
+# how often the audio queue needs topping up while sound is playing
+AUDIO_PUMP_INTERVAL = 0.02
+# how often the window handles GUI events when nothing else is going on
+IDLE_INTERVAL = 0.1
 
 
 class DisplayWindow(threading.Thread):
-    def __init__(self):
+    def __init__(
+        self,
+        framebuffer: Framebuffer,
+        audio: AudioSink,
+        title: str = TITLE,
+        fps: int = FPS,
+    ):
         super().__init__(daemon=True)
-        self.screen = queue.Queue()
+        self.title = title
+        self.screen = FrameSlot[int]()
+        self.framebuffer = framebuffer
+        self.audio = audio
+        self.frame_interval = 1 / fps
+        self.generation = 0
         self.running = True
+        self.render_time = 0.0
+        self.wait_time = 0.0
         self.logger = get_logger(self.__class__.__name__)
 
     def close(self):
         self.running = False
 
-    def update_frame(self, image: Image.Image):
-        numpy_image = np.array(image)
-        img = cv2.cvtColor(numpy_image, cv2.COLOR_RGB2BGR)
-        self.screen.put(img, block=False)
+    def update_frame(self, generation: int):
+        self.screen.put(generation)
+
+    @property
+    def stats(self) -> FrameStats:
+        return {
+            "produced": self.screen.produced,
+            "displayed": self.screen.taken,
+            "dropped": self.screen.dropped,
+            "render_time": self.render_time,
+            "wait_time": self.wait_time,
+        }
 
     def update_audio(self, data: bytes):
-        pygame.mixer.Sound(buffer=data).play()
+        self.audio.write(data)
 
     def run(self):
-        pygame.mixer.init(44100, -16, 2, buffer=512)
-        cv2.namedWindow(
-            "Upgrade My Windows", cv2.WINDOW_AUTOSIZE | cv2.WINDOW_GUI_NORMAL
-        )
+        pygame.mixer.init(SAMPLE_RATE, -8 * SAMPLE_WIDTH, CHANNELS, buffer=512)
+        self.audio.open()
+        cv2.namedWindow(self.title, cv2.WINDOW_AUTOSIZE | cv2.WINDOW_GUI_NORMAL)
+        last_render = 0.0
         while self.running:
-            if not self.screen.empty():
-                image = self.screen.get()
-                cv2.imshow("Upgrade My Windows", image)
+            # sleep until a frame shows up, waking only as often as audio needs
+            playing = bool(self.audio.chunks) or (
+                self.audio.channel is not None and self.audio.channel.get_busy()
+            )
+            start = time.perf_counter()
+            frame = self.screen.wait(AUDIO_PUMP_INTERVAL if playing else IDLE_INTERVAL)
+            self.audio.pump()
+            if frame is not None:
+                # don't draw faster than the refresh rate, we draw whatever the
+                # framebuffer has by then so frames arriving meanwhile are covered
+                delay = last_render + self.frame_interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.wait_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            if frame is not None:
+                with self.framebuffer.read() as (image, generation):
+                    if image is not None and generation != self.generation:
+                        cv2.imshow(self.title, image)
+                        self.generation = generation
+                last_render = time.perf_counter()
             cv2.waitKey(1)
+            self.render_time += time.perf_counter() - start
 
+        self.audio.close()
         cv2.destroyAllWindows()
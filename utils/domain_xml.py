@@ -0,0 +1,152 @@
+import re
+from typing import NamedTuple
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+LIBOSINFO_NS = "http://libosinfo.org/xmlns/libvirt/domain/1.0"
+
+ElementTree.register_namespace("libosinfo", LIBOSINFO_NS)
+
+STEP_RE = re.compile(r"([^\[\]/]+)((?:\[@[^=\]]+='[^']*'\])*)")
+PREDICATE_RE = re.compile(r"\[@([^=\]]+)='([^']*)'\]")
+
+
+class Step(NamedTuple):
+    tag: str
+    predicates: tuple[tuple[str, str], ...]
+
+
+class Field(NamedTuple):
+    steps: tuple[Step, ...]
+    # None means the raw XML of the matched element is captured instead
+    attribute: str | None
+
+
+class _Done(Exception):
+    pass
+
+
+def compile_path(path: str) -> Field:
+    # a tiny XPath subset: "a/b[@attr='value']/c/@attr"
+    segments = path.split("/")
+    attribute = None
+    if segments[-1].startswith("@"):
+        attribute = segments.pop()[1:]
+
+    steps = []
+    for segment in segments:
+        match = STEP_RE.fullmatch(segment)
+        if not match:
+            raise ValueError(f"Invalid path segment {segment!r} in {path!r}")
+        steps.append(Step(match[1], tuple(PREDICATE_RE.findall(match[2]))))
+    return Field(tuple(steps), attribute)
+
+
+class DomainXMLExtractor:
+    fields: dict[str, Field]
+
+    def __init__(self, fields: dict[str, str]):
+        self.fields = {name: compile_path(path) for name, path in fields.items()}
+
+    def extract(self, raw_xml: str) -> dict[str, str | None]:
+        data = raw_xml.encode("utf-8")
+        results: dict[str, str | None] = {name: None for name in self.fields}
+        remaining = dict(self.fields)
+        # (name, depth, start byte) of elements whose raw XML is being captured
+        captures: list[tuple[str, int, int]] = []
+        stack: list[tuple[str, dict[str, str]]] = []
+        parser = expat.ParserCreate()
+
+        def start_element(tag: str, attrs: dict[str, str]):
+            stack.append((tag, attrs))
+            depth = len(stack)
+            for name, field in list(remaining.items()):
+                steps = field.steps
+                if len(steps) != depth or steps[-1].tag != tag:
+                    continue
+                if not all(
+                    step.tag == element_tag
+                    and all(element_attrs.get(k) == v for k, v in step.predicates)
+                    for step, (element_tag, element_attrs) in zip(steps, stack)
+                ):
+                    continue
+                del remaining[name]
+                if field.attribute is None:
+                    captures.append((name, depth, parser.CurrentByteIndex))
+                else:
+                    results[name] = attrs.get(field.attribute)
+            if not remaining and not captures:
+                raise _Done()
+
+        def end_element(tag: str):
+            depth = len(stack)
+            for capture in list(captures):
+                name, capture_depth, start = capture
+                if capture_depth != depth:
+                    continue
+                end = data.index(b">", start) + 1
+                if data[end - 2 : end - 1] != b"/":
+                    # not a self-closing tag, so it ends at the current end tag
+                    end = data.index(b">", parser.CurrentByteIndex) + 1
+                results[name] = data[start:end].decode("utf-8")
+                captures.remove(capture)
+            stack.pop()
+            if not remaining and not captures:
+                raise _Done()
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        try:
+            parser.Parse(data, True)
+        except _Done:
+            # everything we wanted was found, skip the rest of the document
+            pass
+        return results
+
+
+DOMAIN_INFO = DomainXMLExtractor(
+    {
+        "os": "domain/metadata/libosinfo:libosinfo/libosinfo:os/@id",
+        "cdrom": "domain/devices/disk[@device='cdrom']/source/@file",
+        "floppy": "domain/devices/disk[@device='floppy']/source/@file",
+    }
+)
+
+DOMAIN_DISKS = DomainXMLExtractor(
+    {
+        "cdrom": "domain/devices/disk[@device='cdrom']",
+        "floppy": "domain/devices/disk[@device='floppy']",
+    }
+)
+
+DOMAIN_GRAPHICS = DomainXMLExtractor(
+    {
+        "socket": "domain/devices/graphics[@type='vnc']/@socket",
+        "listen_socket": "domain/devices/graphics[@type='vnc']/listen[@type='socket']/@socket",
+    }
+)
+
+OSINFO_METADATA = f'<libosinfo:libosinfo xmlns:libosinfo="{LIBOSINFO_NS}"/>'
+
+
+def get_disk_source(disk_xml: str) -> str | None:
+    source = ElementTree.fromstring(disk_xml).find("source")
+    return source.get("file") if source is not None else None
+
+
+def set_disk_source(disk_xml: str, path: str | None) -> str:
+    disk = ElementTree.fromstring(disk_xml)
+    source = disk.find("source")
+    if source is None:
+        source = ElementTree.SubElement(disk, "source")
+    source.set("file", path or "")
+    return ElementTree.tostring(disk, encoding="unicode")
+
+
+def set_osinfo_id(metadata_xml: str, os_id: str) -> str:
+    metadata = ElementTree.fromstring(metadata_xml)
+    osinfo = metadata.find(f"{{{LIBOSINFO_NS}}}os")
+    if osinfo is None:
+        osinfo = ElementTree.SubElement(metadata, f"{{{LIBOSINFO_NS}}}os")
+    osinfo.set("id", os_id)
+    return ElementTree.tostring(metadata, encoding="unicode")
@@ -0,0 +1,88 @@
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+from collections.abc import Coroutine
+
+Events = TypeVar("Events", bound=str)
+
+
+class EventListener(Generic[Events]):
+    event_listeners: dict[Events, Callable[..., Coroutine[Any, Any, Any]]]
+    event_loops: dict[Events, asyncio.AbstractEventLoop]
+    coalesced_tasks: dict[Events, asyncio.Task]
+    coalesced_pending: dict[Events, tuple]
+
+    def __init__(self):
+        self.event_listeners = {}
+        self.event_loops = {}
+        self.coalesced_tasks = {}
+        self.coalesced_pending = {}
+
+    def add_event_listener(
+        self,
+        event: Events,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        loop: asyncio.AbstractEventLoop | None = None,
+    ):
+        # with a loop, the callback always runs there no matter which thread
+        # dispatches the event
+        self.event_listeners[event] = callback
+        if loop:
+            self.event_loops[event] = loop
+        else:
+            self.event_loops.pop(event, None)
+
+    def remove_event_listener(self, event: Events):
+        self.event_listeners.pop(event, None)
+        self.event_loops.pop(event, None)
+        self.coalesced_pending.pop(event, None)
+
+    def _call_listener(self, event: Events, args: tuple) -> Awaitable[Any]:
+        coro = self.event_listeners[event](*args)
+        loop = self.event_loops.get(event)
+        if loop and loop is not asyncio.get_running_loop():
+            return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+        return asyncio.ensure_future(coro)
+
+    async def dispatch_event(self, event: Events, *args):
+        if event in self.event_listeners:
+            self._call_listener(event, args)
+
+    def dispatch_event_threadsafe(self, event: Events, *args):
+        # for threads without an event loop, only listeners added with a loop
+        # can be reached from here
+        loop = self.event_loops.get(event)
+        if event in self.event_listeners and loop:
+            asyncio.run_coroutine_threadsafe(self.event_listeners[event](*args), loop)
+
+    async def dispatch_coalesced(
+        self,
+        event: Events,
+        *args,
+        merge: Callable[[tuple, tuple], tuple] | None = None,
+    ):
+        if event not in self.event_listeners:
+            return
+
+        task = self.coalesced_tasks.get(event)
+        if task and not task.done():
+            # the listener is still busy, newer arguments supersede pending ones
+            pending = self.coalesced_pending.get(event)
+            if pending is not None and merge:
+                args = merge(pending, args)
+            self.coalesced_pending[event] = args
+            return
+
+        self.coalesced_tasks[event] = asyncio.create_task(
+            self._run_coalesced(event, args)
+        )
+
+    async def _run_coalesced(self, event: Events, args: tuple | None):
+        while args is not None:
+            if event not in self.event_listeners:
+                break
+            try:
+                await self._call_listener(event, args)
+            except Exception:
+                traceback.print_exc()
+            args = self.coalesced_pending.pop(event, None)
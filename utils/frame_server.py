@@ -0,0 +1,164 @@
+import asyncio
+import struct
+from typing import TYPE_CHECKING
+from utils.audio_buffer import CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH
+from utils.frame_stream import StreamClient
+from utils.logger import get_logger
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+if TYPE_CHECKING:
+    from main import UpgradeMyWindowsBot
+    from utils.vm_session import VMSession
+
+FRAME_SERVER_HOST = "127.0.0.1"
+
+MJPEG_BOUNDARY = "frame"
+# a static screen sends nothing, resending the last frame this often is how we
+# find out an MJPEG viewer went away
+MJPEG_KEEPALIVE = 5.0
+
+# a WAV header with the largest sizes possible, so players keep reading the
+# PCM that follows for as long as we keep sending it
+WAV_HEADER = struct.pack(
+    "<4sI4s4sIHHIIHH4sI",
+    b"RIFF",
+    0xFFFFFFFF,
+    b"WAVE",
+    b"fmt ",
+    16,
+    1,
+    CHANNELS,
+    SAMPLE_RATE,
+    SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH,
+    CHANNELS * SAMPLE_WIDTH,
+    8 * SAMPLE_WIDTH,
+    b"data",
+    0xFFFFFFFF,
+)
+
+
+class FrameServer:
+    # streams every VM screen over HTTP for hosts without a display, only binds
+    # to localhost, put a reverse proxy in front to share it
+    def __init__(
+        self, bot: "UpgradeMyWindowsBot", port: int, host: str = FRAME_SERVER_HOST
+    ):
+        if web is None:
+            raise RuntimeError("aiohttp is required for the frame server")
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.get("/stats", self.stats),
+                web.get("/{uuid}/mjpeg", self.mjpeg),
+                web.get("/{uuid}/ws", self.websocket),
+                web.get("/{uuid}/audio", self.audio),
+            ]
+        )
+        self.runner = web.AppRunner(self.app)
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def start(self):
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.logger.info(f"Frame server listening on http://{self.host}:{self.port}")
+
+    async def close(self):
+        await self.runner.cleanup()
+
+    def _session(self, request: "web.Request") -> "VMSession":
+        uuid = request.match_info["uuid"]
+        session = next(
+            (session for session in self.bot.sessions if session.uuid == uuid), None
+        )
+        if not session:
+            raise web.HTTPNotFound(text=f"No VM with UUID {uuid}")
+        return session
+
+    async def stats(self, request: "web.Request") -> "web.Response":
+        return web.json_response(
+            {
+                session.uuid: {
+                    "encodes": session.stream.encodes,
+                    "clients": [client.stats for client in session.stream.clients],
+                }
+                for session in self.bot.sessions
+            }
+        )
+
+    async def mjpeg(self, request: "web.Request") -> "web.StreamResponse":
+        session = self._session(request)
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+                "Cache-Control": "no-cache",
+            }
+        )
+        await response.prepare(request)
+        client = session.add_stream_client("mjpeg")
+        frame = None
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(client.next(), MJPEG_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if frame is None:
+                        continue
+                await response.write(
+                    f"--{MJPEG_BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(frame)}\r\n\r\n".encode()
+                    + frame
+                    + b"\r\n"
+                )
+        except ConnectionError:
+            pass
+        finally:
+            session.remove_stream_client(client)
+        return response
+
+    async def websocket(self, request: "web.Request") -> "web.WebSocketResponse":
+        session = self._session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client = session.add_stream_client("websocket")
+        sender = asyncio.create_task(self._send_frames(ws, client))
+        try:
+            # the close frame only gets processed while someone is receiving,
+            # viewers don't send us anything else
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+            session.remove_stream_client(client)
+        return ws
+
+    async def _send_frames(self, ws: "web.WebSocketResponse", client: StreamClient):
+        try:
+            while not ws.closed:
+                await ws.send_bytes(await client.next())
+        except ConnectionError:
+            pass
+
+    async def audio(self, request: "web.Request") -> "web.StreamResponse":
+        session = self._session(request)
+        response = web.StreamResponse(
+            headers={"Content-Type": "audio/wav", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        client = session.add_stream_client("audio")
+        try:
+            await response.write(WAV_HEADER)
+            while True:
+                await response.write(await client.next())
+        except ConnectionError:
+            pass
+        finally:
+            session.remove_stream_client(client)
+        return response
@@ -0,0 +1,41 @@
+import threading
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class FrameSlot(Generic[T]):
+    item: T | None
+    produced: int
+    taken: int
+    dropped: int
+    condition: threading.Condition
+
+    def __init__(self):
+        self.item = None
+        self.produced = 0
+        self.taken = 0
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, item: T):
+        with self.condition:
+            if self.item is not None:
+                # nobody took the previous frame, the new one replaces it
+                self.dropped += 1
+            self.item = item
+            self.produced += 1
+            self.condition.notify_all()
+
+    def take(self) -> T | None:
+        with self.condition:
+            item, self.item = self.item, None
+            if item is not None:
+                self.taken += 1
+            return item
+
+    def wait(self, timeout: float | None = None) -> T | None:
+        # blocks until there's something to take, or gives up with None
+        with self.condition:
+            self.condition.wait_for(lambda: self.item is not None, timeout)
+            return self.take()
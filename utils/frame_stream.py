@@ -0,0 +1,217 @@
+import asyncio
+import io
+import struct
+import threading
+import time
+from concurrent.futures import Executor
+from PIL import Image
+from typing import Literal
+from typings.stream_client_stats import StreamClientStats
+from utils.framebuffer import Framebuffer, Rect
+from utils.logger import get_logger
+
+StreamKind = Literal["mjpeg", "websocket", "audio"]
+
+# a client more than this many messages behind starts losing the oldest ones
+CLIENT_QUEUE_SIZE = 2
+STREAM_QUALITY = 75
+# past this many damaged rects, one patch covering all of them is cheaper
+MAX_PATCHES = 32
+
+# x, y, width, height and the JPEG length of every patch in a websocket message
+PATCH_HEADER = struct.Struct("!HHHHI")
+
+
+class StreamClient:
+    kind: StreamKind
+    queue: asyncio.Queue[bytes]
+    connected_at: float
+    bytes_sent: int
+    messages_sent: int
+    dropped: int
+    # websocket clients patch their own copy of the screen, after losing a
+    # message they need the whole frame again
+    needs_keyframe: bool
+
+    def __init__(self, kind: StreamKind):
+        self.kind = kind
+        self.queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.connected_at = time.monotonic()
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.dropped = 0
+        self.needs_keyframe = kind == "websocket"
+
+    @property
+    def stats(self) -> StreamClientStats:
+        connected_time = time.monotonic() - self.connected_at
+        return {
+            "kind": self.kind,
+            "connected_time": connected_time,
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "dropped": self.dropped,
+            "bandwidth": self.bytes_sent / connected_time if connected_time else 0,
+        }
+
+    def offer(self, data: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.kind == "websocket":
+                self.needs_keyframe = True
+        self.queue.put_nowait(data)
+
+    async def next(self) -> bytes:
+        data = await self.queue.get()
+        self.bytes_sent += len(data)
+        self.messages_sent += 1
+        return data
+
+
+class FrameStream:
+    # fans the framebuffer and audio out to frame server clients, every frame is
+    # encoded once no matter how many clients are connected
+    framebuffer: Framebuffer
+    executor: Executor
+    clients: set[StreamClient]
+    viewers: int
+    listeners: int
+    audio_clients: tuple[StreamClient, ...]
+    loop: asyncio.AbstractEventLoop | None
+    pending: list[Rect]
+    lock: threading.Lock
+    updated: asyncio.Event
+    task: asyncio.Task | None
+    encodes: int
+
+    def __init__(self, framebuffer: Framebuffer, executor: Executor):
+        self.framebuffer = framebuffer
+        self.executor = executor
+        self.clients = set()
+        # the VNC thread reads these instead of iterating clients, which the
+        # bot's loop keeps changing, only touched under lock
+        self.viewers = 0
+        self.listeners = 0
+        self.audio_clients = ()
+        self.loop = None
+        self.pending = []
+        self.lock = threading.Lock()
+        self.updated = asyncio.Event()
+        self.task = None
+        self.encodes = 0
+        self.logger = get_logger(self.__class__.__name__)
+
+    def add_client(self, kind: StreamKind) -> StreamClient:
+        self.loop = asyncio.get_running_loop()
+        client = StreamClient(kind)
+        with self.lock:
+            self.clients.add(client)
+            self._count_clients()
+        if kind != "audio":
+            # new viewers get the current frame right away
+            self.updated.set()
+            if not self.task or self.task.done():
+                self.task = asyncio.create_task(self._run())
+        return client
+
+    def remove_client(self, client: StreamClient):
+        with self.lock:
+            self.clients.discard(client)
+            self._count_clients()
+
+    def _count_clients(self):
+        self.audio_clients = tuple(
+            client for client in self.clients if client.kind == "audio"
+        )
+        self.listeners = len(self.audio_clients)
+        self.viewers = len(self.clients) - self.listeners
+
+    # update_frame and update_audio are called from the VNC thread
+
+    def update_frame(self, rects: list[Rect]):
+        if not self.viewers or not self.loop:
+            return
+        with self.lock:
+            self.pending += rects
+        self.loop.call_soon_threadsafe(self.updated.set)
+
+    def update_audio(self, data: bytes):
+        if not self.listeners or not self.loop:
+            return
+        with self.lock:
+            clients = self.audio_clients
+        for client in clients:
+            self.loop.call_soon_threadsafe(client.offer, data)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.viewers:
+            await self.updated.wait()
+            self.updated.clear()
+            with self.lock:
+                rects, self.pending = self.pending, []
+
+            clients = [client for client in self.clients if client.kind != "audio"]
+            keyframe = any(
+                client.kind == "mjpeg" or client.needs_keyframe for client in clients
+            )
+            patches = any(not client.needs_keyframe for client in clients)
+            result = await loop.run_in_executor(
+                self.executor,
+                self._encode,
+                keyframe,
+                rects if patches else [],
+            )
+            if result is None:
+                continue
+            self.encodes += 1
+
+            frame, message = result
+            for client in clients:
+                if client.kind == "mjpeg":
+                    client.offer(frame)
+                elif client.needs_keyframe:
+                    client.needs_keyframe = False
+                    client.offer(self._patch_message([(Rect(0, 0, 0, 0), frame)]))
+                elif message:
+                    client.offer(message)
+
+    def _encode(self, keyframe: bool, rects: list[Rect]) -> tuple[bytes, bytes] | None:
+        with self.framebuffer.read() as (frame, _):
+            if frame is None:
+                return None
+            image = Image.fromarray(frame[..., ::-1])
+
+        if len(rects) > MAX_PATCHES:
+            left = min(x for x, _, _, _ in rects)
+            top = min(y for _, y, _, _ in rects)
+            right = max(x + w for x, _, w, _ in rects)
+            bottom = max(y + h for _, y, _, h in rects)
+            rects = [Rect(left, top, right - left, bottom - top)]
+
+        patches = []
+        for x, y, w, h in rects:
+            if w > 0 and h > 0:
+                region = image.crop((x, y, x + w, y + h))
+                patches.append((Rect(x, y, w, h), self._jpeg(region)))
+        return (
+            self._jpeg(image) if keyframe else b"",
+            self._patch_message(patches) if patches else b"",
+        )
+
+    def _patch_message(self, patches: list[tuple[Rect, bytes]]) -> bytes:
+        # a zero sized rect means the patch is the whole frame
+        return b"".join(
+            PATCH_HEADER.pack(x, y, w, h, len(data)) + data
+            for (x, y, w, h), data in patches
+        )
+
+    def _jpeg(self, image: Image.Image) -> bytes:
+        with io.BytesIO() as image_binary:
+            image.save(image_binary, format="JPEG", quality=STREAM_QUALITY)
+            return image_binary.getvalue()
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
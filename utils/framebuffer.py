@@ -0,0 +1,90 @@
+import numpy as np
+import threading
+from PIL.Image import Image
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from typing import NamedTuple
+
+
+class Rect(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class Move(NamedTuple):
+    # a CopyRect, the region at src_x, src_y moves to rect
+    src_x: int
+    src_y: int
+    rect: Rect
+
+
+class Framebuffer:
+    front: np.ndarray | None
+    back: np.ndarray | None
+    generation: int
+    lock: threading.Lock
+    _stale: list[Rect]
+
+    def __init__(self):
+        self.front = None
+        self.back = None
+        self.generation = 0
+        self.lock = threading.Lock()
+        # regions the front buffer got in the last swap that the back buffer
+        # doesn't have yet
+        self._stale = []
+
+    @property
+    def size(self) -> tuple[int, int] | None:
+        front = self.front
+        if front is None:
+            return None
+        height, width = front.shape[:2]
+        return width, height
+
+    @contextmanager
+    def read(self) -> Iterator[tuple[np.ndarray | None, int]]:
+        with self.lock:
+            yield self.front, self.generation
+
+    def update(
+        self, image: Image, rects: list[Rect], moves: Sequence[Move] = ()
+    ) -> int:
+        width, height = image.size
+        if self.back is None or self.back.shape[:2] != (height, width):
+            # first frame or the guest changed its resolution, copy everything
+            self.back = np.empty((height, width, 3), dtype=np.uint8)
+            rects = [Rect(0, 0, width, height)]
+            moves = ()
+        elif self.front is not None:
+            self._copy_front(self._stale)
+
+        # moves go first, in order, they only read what the previous frame had
+        # and numpy copies overlapping regions correctly
+        for src_x, src_y, (x, y, w, h) in moves:
+            self.back[y : y + h, x : x + w] = self.back[
+                src_y : src_y + h, src_x : src_x + w
+            ]
+
+        for x, y, w, h in rects:
+            right = min(x + w, width)
+            bottom = min(y + h, height)
+            if x >= right or y >= bottom:
+                continue
+            region = np.asarray(image.crop((x, y, right, bottom)).convert("RGB"))
+            # RGB -> BGR while copying, so we don't need another cvtColor pass
+            self.back[y:bottom, x:right] = region[..., ::-1]
+
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.generation += 1
+            generation = self.generation
+        self._stale = rects + [move.rect for move in moves]
+        return generation
+
+    def _copy_front(self, rects: list[Rect]):
+        # only the writer swaps buffers, so the front buffer is safe to read here
+        for x, y, w, h in rects:
+            self.back[y : y + h, x : x + w] = self.front[y : y + h, x : x + w]  # type: ignore
@@ -3,6 +3,14 @@ import traceback
 import logging
 import discord
 import inspect
+from utils.input_queue import InputQueueFull
+
+
+async def send_reply(interaction: discord.Interaction, message: str):
+    if interaction.response.is_done():
+        await interaction.followup.send(message)
+    else:
+        await interaction.response.send_message(message)
 
 
 def handle_exception(logger: "logging.Logger | None" = None):
@@ -13,6 +21,14 @@ def handle_exception(logger: "logging.Logger | None" = None):
             async def async_wrapper(*args, **kwargs):
                 try:
                     return await func(*args, **kwargs)
+                except InputQueueFull:
+                    interaction = args[1] if len(args) > 1 else None
+                    if type(interaction) == discord.Interaction:
+                        await send_reply(
+                            interaction,
+                            "Too many inputs are waiting for the VM. Try again in a moment.",
+                        )
+                    return None
                 except Exception as e:
                     if logger:
                         logger.exception(e)
@@ -29,14 +45,10 @@ def handle_exception(logger: "logging.Logger | None" = None):
                                 interaction is not None
                                 and type(interaction) == discord.Interaction
                             ):
-                                if interaction.response.is_done():
-                                    await interaction.followup.send(
-                                        "An error occurred. Please report this to the developer."
-                                    )
-                                else:
-                                    await interaction.response.send_message(
-                                        "An error occurred. Please report this to the developer."
-                                    )
+                                await send_reply(
+                                    interaction,
+                                    "An error occurred. Please report this to the developer.",
+                                )
                         else:
                             traceback.print_exc()
                     return None
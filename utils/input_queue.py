@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Callable, Coroutine, Hashable
+from typing import Any
+from typings.input_stats import InputStats
+
+MAX_DEPTH = 256
+MAX_USER_DEPTH = 32
+
+# events of these kinds replace a pending event of the same kind right before
+# them, only the latest one matters
+MERGEABLE = {"mouseMove"}
+
+
+class InputQueueFull(Exception):
+    pass
+
+
+class InputEvent:
+    kind: str
+    func: Callable[..., Coroutine[Any, Any, Any]]
+    args: tuple
+    futures: list["asyncio.Future[None]"]
+    queued_at: float
+
+    def __init__(
+        self,
+        kind: str,
+        func: Callable[..., Coroutine[Any, Any, Any]],
+        args: tuple,
+        future: "asyncio.Future[None]",
+    ):
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.futures = [future]
+        self.queued_at = time.monotonic()
+
+
+class InputQueue:
+    # every method has to be called on the VNC event loop
+    queues: dict[Hashable, deque[InputEvent]]
+    max_depth: int
+    max_user_depth: int
+    depth: int
+    task: asyncio.Task | None
+    current: InputEvent | None
+    executed: int
+    merged: int
+    rejected: int
+    total_wait: float
+    max_wait: float
+
+    def __init__(
+        self, max_depth: int = MAX_DEPTH, max_user_depth: int = MAX_USER_DEPTH
+    ):
+        # insertion ordered, the user at the front is served next
+        self.queues = {}
+        self.max_depth = max_depth
+        self.max_user_depth = max_user_depth
+        self.depth = 0
+        self.task = None
+        # already popped from its queue, cancel() has to find it here
+        self.current = None
+        self.executed = 0
+        self.merged = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def stats(self) -> InputStats:
+        return {
+            "queued": self.depth,
+            "executed": self.executed,
+            "merged": self.merged,
+            "rejected": self.rejected,
+            "average_wait": self.total_wait / self.executed if self.executed else None,
+            "max_wait": self.max_wait,
+        }
+
+    async def submit(
+        self,
+        user: Hashable,
+        kind: str,
+        func: Callable[..., Coroutine[Any, Any, Any]],
+        *args,
+    ):
+        # resolves once the event has actually been sent to the server
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.get(user)
+        if queue and kind in MERGEABLE and queue[-1].kind == kind:
+            queue[-1].args = args
+            queue[-1].futures.append(future)
+            self.merged += 1
+        else:
+            if self.depth >= self.max_depth or (
+                queue and len(queue) >= self.max_user_depth
+            ):
+                self.rejected += 1
+                raise InputQueueFull()
+            if queue is None:
+                queue = self.queues[user] = deque()
+            queue.append(InputEvent(kind, func, args, future))
+            self.depth += 1
+
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        await future
+
+    def cancel(self, exception: Exception):
+        events = [event for queue in self.queues.values() for event in queue]
+        if self.current:
+            events.append(self.current)
+        for event in events:
+            self._fail(event, exception)
+        self.queues.clear()
+        self.depth = 0
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def close(self, exception: Exception):
+        # cancel() and give the waiting submit() calls a chance to see it, call
+        # this before the loop stops or the futures chained to other loops
+        # never resolve
+        task = self.task
+        self.cancel(exception)
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+        # one iteration wakes submit(), the next runs its task's done callbacks
+        for _ in range(2):
+            await asyncio.sleep(0)
+
+    @staticmethod
+    def _fail(event: InputEvent, exception: BaseException):
+        for future in event.futures:
+            if not future.done():
+                future.set_exception(exception)
+
+    async def _run(self):
+        while self.queues:
+            # round robin, so one user spamming can't starve the others
+            user = next(iter(self.queues))
+            queue = self.queues.pop(user)
+            event = queue.popleft()
+            if queue:
+                self.queues[user] = queue
+            self.depth -= 1
+
+            wait = time.monotonic() - event.queued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.executed += 1
+            self.current = event
+            try:
+                await event.func(*event.args)
+            except asyncio.CancelledError:
+                self._fail(event, ConnectionError("Input was cancelled"))
+                raise
+            except Exception as e:
+                self._fail(event, e)
+            else:
+                for future in event.futures:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                self.current = None
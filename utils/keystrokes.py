@@ -0,0 +1,77 @@
+import codecs
+import regex as re
+from functools import lru_cache
+from vncdotool.client import KEYMAP
+
+BACKTICK_RE = re.compile(r"(?<=(?<!\\)(?:\\\\)*)`((?:[^`\\]|\\.)*)`")
+HYPEN_RE = re.compile(r"(?<=(?<!\\)(?:\\\\)*)-")
+
+BACKSLASH_KEYMAP = {
+    "\n": 0xFF0D,
+    "\t": 0xFF09,
+    "\r": 0xFF0D,
+    "\b": 0xFF08,
+    "\x1b": 0xFF1B,
+}
+
+for value in KEYMAP.values():
+    BACKSLASH_KEYMAP[chr(value)] = value
+
+# compiled programs kept around, people repeat the same few combos a lot
+PROGRAM_CACHE_SIZE = 256
+
+# (keysym, down)
+KeyEvent = tuple[int, bool]
+KeyProgram = tuple[KeyEvent, ...]
+
+
+def char_keysym(char: str) -> int:
+    return BACKSLASH_KEYMAP.get(char) or KEYMAP.get(char) or ord(char)
+
+
+def char_events(
+    text: str, key_down: bool = True, key_up: bool = True
+) -> list[KeyEvent]:
+    events = []
+    for char in text:
+        keysym = char_keysym(char)
+        if key_down:
+            events.append((keysym, True))
+        if key_up:
+            events.append((keysym, False))
+    return events
+
+
+@lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def compile_keystrokes(
+    text: str, key_down: bool = True, key_up: bool = True
+) -> KeyProgram:
+    # match backticks
+    matches = BACKTICK_RE.findall(text)
+    # split backticks and escape backslashes
+    texts = [
+        codecs.escape_decode(text.encode("utf-8"))[0].decode("utf-8")  # type: ignore - escape_decode returns Tuple[bytes, int]
+        for text in BACKTICK_RE.split(text)[::2]
+    ]
+
+    events = []
+    for match, text in zip(matches, texts):
+        events += char_events(text, key_down, key_up)
+
+        # press every key of the combo in order, then release them in order
+        match_sequences = HYPEN_RE.split(match)
+        for down in (True, False):
+            if not (key_down if down else key_up):
+                continue
+            for sequence in match_sequences:
+                converted = KEYMAP.get(sequence)
+                if converted:
+                    events.append((converted, down))
+                else:
+                    events += char_events(sequence, down, not down)
+
+    if len(texts) > len(matches):
+        events += char_events(texts[-1], key_down, key_up)
+
+    # immutable, so the cached program can be shared between callers
+    return tuple(events)
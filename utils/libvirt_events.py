@@ -0,0 +1,23 @@
+import libvirt
+import threading
+from utils.logger import get_logger
+
+_thread: threading.Thread | None = None
+
+
+def _run():
+    logger = get_logger("LibvirtEvents")
+    logger.info("libvirt event loop started")
+    while True:
+        if libvirt.virEventRunDefaultImpl() < 0:
+            logger.error("Failed to run libvirt event loop")
+
+
+def start_event_loop():
+    # has to happen before opening any connection that registers callbacks
+    global _thread
+    if _thread:
+        return
+    libvirt.virEventRegisterDefaultImpl()
+    _thread = threading.Thread(target=_run, daemon=True, name="libvirt-events")
+    _thread.start()
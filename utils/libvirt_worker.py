@@ -0,0 +1,94 @@
+import asyncio
+import libvirt
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+from typings.libvirt_call_stats import LibvirtCallStats
+from utils.logger import get_logger
+
+T = TypeVar("T")
+
+# calls slower than this get logged as warnings
+SLOW_CALL = 1.0
+
+
+class LibvirtWorker:
+    executor: ThreadPoolExecutor
+    virt: libvirt.virConnect | None
+    connected: bool
+    call_stats: dict[str, LibvirtCallStats]
+    stats_lock: threading.Lock
+
+    def __init__(self):
+        # libvirt calls block, so one thread owns the connection and runs them all
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="libvirt")
+        self.virt = None
+        self.connected = False
+        self.call_stats = {}
+        # updated on the worker thread, read by /stats on the bot's loop
+        self.stats_lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+
+    @property
+    def stats(self) -> dict[str, LibvirtCallStats]:
+        with self.stats_lock:
+            return {
+                name: {**stats}  # type: ignore
+                for name, stats in self.call_stats.items()
+            }
+
+    def _timed(self, func: Callable[..., T], *args: Any) -> T:
+        name = getattr(func, "__name__", repr(func))
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.stats_lock:
+                stats = self.call_stats.setdefault(
+                    name, {"calls": 0, "total_time": 0.0, "max_time": 0.0}
+                )
+                stats["calls"] += 1
+                stats["total_time"] += elapsed
+                stats["max_time"] = max(stats["max_time"], elapsed)
+            if elapsed >= SLOW_CALL:
+                self.logger.warning(f"{name} took {elapsed:.3f}s")
+            else:
+                self.logger.debug(f"{name} took {elapsed * 1000:.1f}ms")
+
+    def submit(self, func: Callable[..., T], *args: Any) -> "Future[T]":
+        return self.executor.submit(self._timed, func, *args)
+
+    async def call(self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _on_close(self, conn: libvirt.virConnect, reason: int, opaque: Any):
+        self.logger.warning(f"libvirt connection closed (reason {reason})")
+        self.connected = False
+
+    def _open(self, uri: str | None) -> libvirt.virConnect:
+        virt = libvirt.open(uri)
+        virt.registerCloseCallback(self._on_close, None)
+        return virt
+
+    async def open(self, uri: str | None = None) -> libvirt.virConnect:
+        self.virt = await self.call(self._open, uri)
+        self.connected = True
+        return self.virt
+
+    def _close(self, virt: libvirt.virConnect):
+        try:
+            virt.unregisterCloseCallback()
+        except libvirt.libvirtError:
+            pass
+        virt.close()
+
+    async def close(self):
+        virt, self.virt = self.virt, None
+        self.connected = False
+        if virt:
+            await self.call(self._close, virt)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+import asyncio
+import discord
+import io
+import time
+from PIL import Image
+from typing import TYPE_CHECKING, Literal
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from utils.vm_session import VMSession
+
+PreviewFormat = Literal["webp", "gif"]
+
+# Discord rate limits message edits, a few seconds per clip keeps us well clear
+PUBLISH_INTERVAL = 5.0
+CAPTURE_FPS = 2
+# previews are for keeping an eye on the VM, not for reading small text
+PREVIEW_WIDTH = 640
+
+PIL_FORMATS: dict[PreviewFormat, str] = {
+    "webp": "WEBP",
+    "gif": "GIF",
+}
+
+PREVIEW_OPTIONS: dict[PreviewFormat, dict] = {
+    "webp": {"quality": 60, "method": 0},
+    "gif": {"optimize": False},
+}
+
+
+class LivePreview:
+    # one per channel, every viewer in the channel shares its message and encodes
+    session: "VMSession"
+    channel: discord.abc.Messageable
+    format: PreviewFormat
+    until: float
+    message: discord.Message | None
+    task: asyncio.Task | None
+    generation: int
+    published_generation: int
+    last_frame: Image.Image | None
+    published: int
+    skipped: int
+
+    def __init__(
+        self,
+        session: "VMSession",
+        channel: discord.abc.Messageable,
+        format: PreviewFormat,
+        duration: float,
+    ):
+        self.session = session
+        self.channel = channel
+        self.format = format
+        self.until = time.monotonic() + duration
+        self.message = None
+        self.task = None
+        self.generation = -1
+        self.published_generation = -1
+        self.last_frame = None
+        self.published = 0
+        self.skipped = 0
+        self.logger = get_logger(self.__class__.__name__)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        self.session.vnc.governor.add_viewer()
+        self.task = asyncio.create_task(self._run())
+
+    def extend(self, duration: float):
+        self.until = max(self.until, time.monotonic() + duration)
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def _run(self):
+        try:
+            while time.monotonic() < self.until:
+                frames, durations = await self._capture_clip()
+                await self._publish(frames, durations)
+        except discord.HTTPException as e:
+            # most likely someone deleted the message
+            self.logger.warning(f"Live preview stopped: {e}")
+        finally:
+            self.session.vnc.governor.remove_viewer()
+            # don't keep finished previews and their message around, a new
+            # /watch may already have replaced this one
+            for channel_id, preview in list(self.session.previews.items()):
+                if preview is self:
+                    del self.session.previews[channel_id]
+            self.logger.info(
+                f"Live preview ended after {self.published} clips, "
+                f"{self.skipped} skipped"
+            )
+            if self.message:
+                try:
+                    await self.message.edit(content="Live preview ended.")
+                except discord.HTTPException:
+                    pass
+
+    async def _capture_clip(self) -> tuple[list[Image.Image], list[int]]:
+        # samples the framebuffer, an unchanged screen only makes the previous
+        # frame last longer instead of adding (and encoding) a duplicate
+        loop = asyncio.get_running_loop()
+        frame_ms = int(1000 / CAPTURE_FPS)
+        frames: list[Image.Image] = []
+        durations: list[int] = []
+        for _ in range(int(PUBLISH_INTERVAL * CAPTURE_FPS)):
+            if self.session.framebuffer.generation == self.generation:
+                if frames:
+                    durations[-1] += frame_ms
+                elif self.last_frame:
+                    frames.append(self.last_frame)
+                    durations.append(frame_ms)
+            else:
+                result = await loop.run_in_executor(
+                    self.session.screenshots.executor, self._grab
+                )
+                if result:
+                    self.generation, self.last_frame = result
+                    frames.append(self.last_frame)
+                    durations.append(frame_ms)
+            await asyncio.sleep(1 / CAPTURE_FPS)
+        return frames, durations
+
+    def _grab(self) -> tuple[int, Image.Image] | None:
+        with self.session.framebuffer.read() as (frame, generation):
+            if frame is None:
+                return None
+            image = Image.fromarray(frame[..., ::-1])
+        width, height = image.size
+        if width > PREVIEW_WIDTH:
+            image = image.resize(
+                (PREVIEW_WIDTH, height * PREVIEW_WIDTH // width),
+                Image.Resampling.BILINEAR,
+            )
+        return generation, image
+
+    async def _publish(self, frames: list[Image.Image], durations: list[int]):
+        if not frames or (
+            len(frames) == 1 and self.generation == self.published_generation
+        ):
+            # nothing changed since the last clip, leave the message alone
+            self.skipped += 1
+            return
+
+        data = await asyncio.get_running_loop().run_in_executor(
+            self.session.screenshots.executor, self._encode, frames, durations
+        )
+        self.published_generation = self.generation
+        self.published += 1
+        file = discord.File(io.BytesIO(data), filename=f"preview.{self.format}")
+        if self.message:
+            await self.message.edit(attachments=[file])
+        else:
+            self.message = await self.channel.send(file=file)
+
+    def _encode(self, frames: list[Image.Image], durations: list[int]) -> bytes:
+        with io.BytesIO() as image_binary:
+            frames[0].save(
+                image_binary,
+                format=PIL_FORMATS[self.format],
+                save_all=True,
+                append_images=frames[1:],
+                duration=durations,
+                loop=0,
+                **PREVIEW_OPTIONS[self.format],
+            )
+            return image_binary.getvalue()
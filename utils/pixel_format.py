@@ -0,0 +1,62 @@
+import numpy as np
+from functools import cache
+from typing import Literal, NamedTuple
+
+PixelFormatName = Literal["bgr233", "rgb565", "rgb888"]
+
+
+class PixelFormat(NamedTuple):
+    # same fields and order as the RFB SetPixelFormat message
+    bpp: int
+    depth: int
+    bigendian: int
+    truecolor: int
+    redmax: int
+    greenmax: int
+    bluemax: int
+    redshift: int
+    greenshift: int
+    blueshift: int
+
+
+# rgb888 is what the client asks for by default, so it needs no negotiation
+PIXEL_FORMATS: dict[PixelFormatName, PixelFormat | None] = {
+    # 256 colors, plenty for 16 color VGA guests
+    "bgr233": PixelFormat(8, 8, 0, 1, 7, 7, 3, 0, 3, 6),
+    "rgb565": PixelFormat(16, 16, 0, 1, 31, 63, 31, 11, 5, 0),
+    "rgb888": None,
+}
+
+
+@cache
+def _build_lut(format: PixelFormat) -> np.ndarray:
+    # every possible pixel value mapped to RGBX, at most 65536 entries
+    values = np.arange(1 << format.bpp, dtype=np.uint32)
+    lut = np.zeros((len(values), 4), dtype=np.uint8)
+    for channel, (maximum, shift) in enumerate(
+        [
+            (format.redmax, format.redshift),
+            (format.greenmax, format.greenshift),
+            (format.bluemax, format.blueshift),
+        ]
+    ):
+        lut[:, channel] = (values >> shift & maximum) * 255 // maximum
+    return lut
+
+
+class PixelExpander:
+    format: PixelFormat
+    dtype: np.dtype
+    lut: np.ndarray
+    padded_lut: np.ndarray
+
+    def __init__(self, format: PixelFormat):
+        self.format = format
+        self.dtype = np.dtype(f"{'>' if format.bigendian else '<'}u{format.bpp // 8}")
+        self.padded_lut = _build_lut(format)
+        self.lut = np.ascontiguousarray(self.padded_lut[:, :3])
+
+    def expand(self, data: bytes, padded: bool = False) -> bytes:
+        # one vectorized lookup turns the whole rectangle into RGB (or RGBX)
+        pixels = np.frombuffer(data, dtype=self.dtype)
+        return (self.padded_lut if padded else self.lut)[pixels].tobytes()
@@ -0,0 +1,43 @@
+from typing import Literal
+
+PathShape = Literal["linear", "bezier"]
+
+# how far the bezier control points bow out, relative to the path length
+BEZIER_BOW = 0.2
+
+Point = tuple[int, int]
+
+
+def _lerp(a: float, b: float, t: float) -> float:
+    return a + (b - a) * t
+
+
+def pointer_path(
+    start: Point, end: Point, steps: int, shape: PathShape | str = "linear"
+) -> tuple[Point, ...]:
+    # the points after start, the last one is always end
+    x0, y0 = start
+    x3, y3 = end
+    dx, dy = x3 - x0, y3 - y0
+    # control points a third of the way in from each end, pushed sideways so
+    # the cursor moves in an arc instead of a ruler-straight line
+    x1 = x0 + dx / 3 - dy * BEZIER_BOW
+    y1 = y0 + dy / 3 + dx * BEZIER_BOW
+    x2 = x0 + dx * 2 / 3 - dy * BEZIER_BOW
+    y2 = y0 + dy * 2 / 3 + dx * BEZIER_BOW
+
+    points: list[Point] = []
+    for i in range(1, max(1, steps) + 1):
+        t = i / max(1, steps)
+        if shape == "bezier":
+            u = 1 - t
+            x = u**3 * x0 + 3 * u**2 * t * x1 + 3 * u * t**2 * x2 + t**3 * x3
+            y = u**3 * y0 + 3 * u**2 * t * y1 + 3 * u * t**2 * y2 + t**3 * y3
+        else:
+            x = _lerp(x0, x3, t)
+            y = _lerp(y0, y3, t)
+        point = (round(x), round(y))
+        # short paths round to the same pixel a lot, no need to send those twice
+        if point != (points[-1] if points else start):
+            points.append(point)
+    return tuple(points)
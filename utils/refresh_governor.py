@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+# refresh rate ceiling while people are watching but nothing changes
+BACKOFF_FPS = 5
+# refresh rate when nobody is watching the screen at all
+IDLE_FPS = 1
+
+
+class RefreshGovernor:
+    fps: int
+    interval: float
+    viewers: int
+    last_refresh: float
+
+    def __init__(self, fps: int):
+        self.fps = fps
+        self.interval = 1 / fps
+        self.viewers = 0
+        self.last_refresh = time.monotonic()
+
+    @property
+    def max_interval(self) -> float:
+        return 1 / (BACKOFF_FPS if self.viewers else IDLE_FPS)
+
+    def add_viewer(self):
+        self.viewers += 1
+        self.wake()
+
+    def remove_viewer(self):
+        self.viewers = max(0, self.viewers - 1)
+
+    def wake(self):
+        self.interval = 1 / self.fps
+
+    def record(self, damaged: bool):
+        if damaged and self.viewers:
+            self.interval = 1 / self.fps
+        else:
+            # static screen (or nobody to show it to), slow down gradually
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    async def wait(self):
+        # pace from the previous refresh so slow refreshes don't add extra delay
+        delay = self.last_refresh + self.interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.last_refresh = time.monotonic()
@@ -0,0 +1,128 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from typing import Any, Literal, NamedTuple
+from utils.framebuffer import Framebuffer
+from utils.logger import get_logger
+
+ScreenshotFormat = Literal["png", "webp", "jpeg"]
+
+# Discord's upload limit outside of boosted guilds
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024
+
+
+class Encoding(NamedTuple):
+    format: ScreenshotFormat
+    options: tuple[tuple[str, Any], ...] = ()
+
+
+PIL_FORMATS: dict[ScreenshotFormat, str] = {
+    "png": "PNG",
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+}
+
+EXTENSIONS: dict[ScreenshotFormat, str] = {
+    "png": "png",
+    "webp": "webp",
+    "jpeg": "jpg",
+}
+
+# cheapest to encode first, lossless first so text stays readable
+AUTO_ENCODINGS = [
+    Encoding("png", (("compress_level", 1),)),
+    Encoding("webp", (("quality", 80), ("method", 0))),
+    Encoding("jpeg", (("quality", 75),)),
+]
+
+
+class ScreenshotService:
+    framebuffer: Framebuffer
+    executor: ThreadPoolExecutor
+    generation: int
+    cache: dict[Encoding, bytes]
+    pending: dict[tuple[int, Encoding], "asyncio.Task[bytes | None]"]
+    hits: int
+    misses: int
+
+    def __init__(self, framebuffer: Framebuffer, max_workers: int = 2):
+        self.framebuffer = framebuffer
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="screenshot"
+        )
+        self.generation = -1
+        self.cache = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def get(
+        self, encoding: Encoding | None = None, limit: int = DEFAULT_UPLOAD_LIMIT
+    ) -> tuple[bytes, Encoding] | None:
+        # without an explicit encoding, pick the first one that fits the limit
+        encodings = [encoding] if encoding else AUTO_ENCODINGS
+        result = None
+        for candidate in encodings:
+            data = await self.encode(candidate)
+            if data is None:
+                return None
+            result = (data, candidate)
+            if len(data) <= limit:
+                break
+        return result
+
+    async def encode(self, encoding: Encoding) -> bytes | None:
+        generation = self.framebuffer.generation
+        if generation == self.generation and encoding in self.cache:
+            self.hits += 1
+            return self.cache[encoding]
+
+        # requests for a frame and encoding that's already being encoded share
+        # that encode, different encodings run side by side on the executor
+        key = (generation, encoding)
+        task = self.pending.get(key)
+        if task:
+            self.hits += 1
+        else:
+            task = self.pending[key] = asyncio.create_task(self._cache(encoding))
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        # one requester giving up shouldn't cancel the encode for the others
+        return await asyncio.shield(task)
+
+    async def _cache(self, encoding: Encoding) -> bytes | None:
+        result = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._encode, encoding
+        )
+        if result is None:
+            return None
+
+        generation, data = result
+        self.misses += 1
+        if generation > self.generation:
+            self.cache.clear()
+            self.generation = generation
+        if generation == self.generation:
+            self.cache[encoding] = data
+        return data
+
+    def _encode(self, encoding: Encoding) -> tuple[int, bytes] | None:
+        with self.framebuffer.read() as (frame, generation):
+            if frame is None:
+                return None
+            img = Image.fromarray(frame[..., ::-1])
+
+        self.logger.debug(
+            f"Encoding screenshot as {encoding.format} for generation {generation}"
+        )
+        with io.BytesIO() as image_binary:
+            img.save(
+                image_binary,
+                format=PIL_FORMATS[encoding.format],
+                **dict(encoding.options),
+            )
+            return generation, image_binary.getvalue()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
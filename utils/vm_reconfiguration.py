@@ -0,0 +1,47 @@
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from utils.vm_session import VMSession
+
+DeviceType = Literal["cdrom", "floppy"]
+
+
+class VMReconfiguration:
+    vcpus: int | None
+    memory: int | None
+    os: str | None
+    devices: dict[DeviceType, str | None]
+
+    def __init__(self, session: "VMSession"):
+        self.session = session
+        self.vcpus = None
+        self.memory = None
+        self.os = None
+        self.devices = {}
+
+    def __repr__(self) -> str:
+        return (
+            f"<VMReconfiguration vcpus={self.vcpus} memory={self.memory} "
+            f"os={self.os} devices={self.devices}>"
+        )
+
+    def set_vcpus(self, vcpus: int) -> "VMReconfiguration":
+        self.vcpus = vcpus
+        return self
+
+    def set_memory(self, memory: int) -> "VMReconfiguration":
+        self.memory = memory
+        return self
+
+    def set_os(self, os: str) -> "VMReconfiguration":
+        self.os = os
+        return self
+
+    def set_device(
+        self, path: str | None = None, type: DeviceType = "cdrom"
+    ) -> "VMReconfiguration":
+        self.devices[type] = path
+        return self
+
+    async def commit(self):
+        await self.session.apply_reconfiguration(self)
@@ -0,0 +1,403 @@
+import asyncio
+import libvirt
+from PIL import Image
+from config import os_list
+from typing import TYPE_CHECKING, Literal
+from typings.audio_stats import AudioStats
+from typings.domain_config import DomainConfig
+from typings.encoding_stats import EncodingStats
+from typings.frame_stats import FrameStats
+from typings.input_stats import InputStats
+from typings.supervisor_stats import SupervisorStats
+from typings.vminfo import VMInfo
+from utils.audio_buffer import CAPACITY_MS, PCMRingBuffer, ms_to_bytes
+from utils.audio_sink import AudioSink
+from utils.display_window import TITLE, DisplayWindow
+from utils.domain_xml import (
+    DOMAIN_DISKS,
+    DOMAIN_GRAPHICS,
+    LIBOSINFO_NS,
+    OSINFO_METADATA,
+    get_disk_source,
+    set_disk_source,
+    set_osinfo_id,
+)
+from utils.frame_stream import FrameStream, StreamClient, StreamKind
+from utils.framebuffer import Framebuffer, Rect
+from utils.live_preview import LivePreview
+from utils.logger import get_logger
+from utils.screenshot_service import ScreenshotService
+from utils.vm_reconfiguration import VMReconfiguration
+from utils.vm_state import VMState
+from utils.vm_supervisor import VMSupervisor
+from utils.vnc_client import VNC_SOCKET, VNCClient
+
+if TYPE_CHECKING:
+    from main import UpgradeMyWindowsBot
+
+
+class VMSession:
+    # everything that belongs to one libvirt domain, the libvirt connection and
+    # its worker are shared through the bot
+    uuid: str
+    vnc_socket: str | None
+    dom: libvirt.virDomain
+    vm_state: VMState
+    vnc: VNCClient
+    framebuffer: Framebuffer
+    display_window: DisplayWindow | None
+    screenshots: ScreenshotService
+    previews: dict[int, LivePreview]
+    stream: FrameStream
+    supervisor: VMSupervisor
+    power_lock: asyncio.Lock
+    stopping: bool
+    audio_buffer: PCMRingBuffer
+
+    def __init__(
+        self, bot: "UpgradeMyWindowsBot", config: DomainConfig, display: bool = False
+    ):
+        self.bot = bot
+        self.uuid = config["uuid"]
+        self.vnc_socket = config.get("vnc_socket")
+        self.virt_worker = bot.virt_worker
+        self.audio_buffer = PCMRingBuffer(
+            ms_to_bytes(max(CAPACITY_MS, bot.audio_flush_ms * 4))
+        )
+        self.framebuffer = Framebuffer()
+        self.display_window = None
+        if display:
+            self.display_window = DisplayWindow(
+                self.framebuffer,
+                AudioSink(bot.audio_flush_size, bot.audio_jitter_chunks),
+                f"{TITLE} ({self.uuid})",
+                bot.fps,
+            )
+            self.display_window.start()
+        self.screenshots = ScreenshotService(self.framebuffer)
+        self.previews = {}
+        self.stream = FrameStream(self.framebuffer, self.screenshots.executor)
+        self.vm_state = VMState(self.virt_worker)
+        self.vnc = VNCClient(self.framebuffer, bot.fps)  # dummy
+        self.supervisor = VMSupervisor(self)
+        self.power_lock = asyncio.Lock()
+        # set while the VM is down because we shut it down, the supervisor
+        # leaves those stops alone
+        self.stopping = False
+        self.logger = get_logger(f"{self.__class__.__name__}-{self.uuid[:8]}")
+
+    @property
+    def _is_virt_connected(self) -> bool:
+        return self.virt_worker.connected
+
+    @property
+    def _is_vm_running(self) -> bool:
+        # kept up to date by libvirt lifecycle events
+        return self._is_virt_connected and self.vm_state.active
+
+    @property
+    def _is_vnc_connected(self) -> bool:
+        return self.vnc.is_alive() and self.vnc.is_connected
+
+    @property
+    def _has_display(self) -> bool:
+        return self.display_window is not None and self.display_window.running
+
+    @property
+    def frame_stats(self) -> FrameStats:
+        if not self.display_window:
+            return {
+                "produced": 0,
+                "displayed": 0,
+                "dropped": 0,
+                "render_time": 0.0,
+                "wait_time": 0.0,
+            }
+        return self.display_window.stats
+
+    @property
+    def audio_stats(self) -> AudioStats:
+        if not self.display_window:
+            return {"buffered": 0, "underruns": 0, "overruns": 0, "dropped_bytes": 0}
+        audio = self.display_window.audio
+        return {
+            "buffered": len(audio.chunks),
+            "underruns": audio.underruns,
+            "overruns": audio.overruns,
+            "dropped_bytes": self.audio_buffer.dropped,
+        }
+
+    @property
+    def supervisor_stats(self) -> SupervisorStats:
+        return self.supervisor.stats
+
+    @property
+    def input_stats(self) -> InputStats:
+        return self.vnc.input_queue.stats
+
+    @property
+    def encoding_stats(self) -> dict[str, EncodingStats]:
+        return self.vnc.encoding_stats
+
+    async def attach(self, virt: libvirt.virConnect):
+        self.logger.info(f"Attaching to domain {self.uuid}")
+        self.dom = await self.virt_worker.call(virt.lookupByUUIDString, self.uuid)
+        await self.virt_worker.call(self.vm_state.attach, virt, self.dom)
+        if not self.vnc_socket:
+            graphics = DOMAIN_GRAPHICS.extract(
+                await self.virt_worker.call(self.dom.XMLDesc)
+            )
+            self.vnc_socket = graphics["socket"] or graphics["listen_socket"]
+        self.logger.info(f"Attached to domain {self.uuid}")
+
+    async def detach(self):
+        self.logger.info(f"Detaching from domain {self.uuid}")
+        if self._is_vnc_connected:
+            await self.disconnect_vnc()
+        self.supervisor.stop()
+        await self.virt_worker.call(self.vm_state.detach)
+        self.logger.info(f"Detached from domain {self.uuid}")
+
+    async def connect_vnc(self, reconnect=False):
+        self.logger.info("Connecting to VNC")
+        if self._is_vnc_connected:
+            if reconnect:
+                self.logger.debug("Disconnecting from VNC for reconnection")
+                await self.disconnect_vnc()
+            else:
+                self.logger.warning(
+                    "Already connected to VNC, ignoring connection request"
+                )
+                return
+        # the pixel format is negotiated per connection, so an OS change applies
+        # with the reboot that comes with it
+        info = self.vm_state.info
+        preset = next(
+            (preset for preset in os_list if info and preset["os"] == info["os"]),
+            None,
+        )
+        self.vnc = VNCClient(
+            self.framebuffer,
+            self.bot.fps,
+            self.vnc_socket or VNC_SOCKET,
+            preset.get("pixel_format") if preset else None,
+            self.bot.vnc_encodings,
+        )
+        # screen and audio listeners stay on the VNC thread and only touch
+        # thread-safe state, everything else comes back to the bot's loop
+        self.vnc.add_event_listener("screen_update", self._on_screen_update)
+        self.vnc.add_event_listener(
+            "ready", self._on_vnc_ready, asyncio.get_running_loop()
+        )
+        self.vnc.add_event_listener("audio_data", self._on_audio_data)
+        if self._has_display:
+            self.vnc.governor.add_viewer()
+        for preview in self.previews.values():
+            if preview.running:
+                self.vnc.governor.add_viewer()
+        for _ in range(self.stream.viewers):
+            self.vnc.governor.add_viewer()
+        self.vnc.start()
+        self.logger.info("Connected to VNC")
+
+    async def _on_screen_update(self, rects: list[Rect], generation: int):
+        if self.display_window:
+            self.display_window.update_frame(generation)
+        self.stream.update_frame(rects)
+
+    async def _on_vnc_ready(self):
+        if self._is_vnc_connected:
+            self.logger.info("VNC is ready")
+            # without a display or frame server there's nothing to play it on
+            if self._has_display or self.bot.frame_server:
+                self.vnc.audioStreamBeginRequest()
+
+    async def _on_audio_data(self, size: int, data: bytes):
+        self.audio_buffer.write(data)
+        while len(self.audio_buffer) >= self.bot.audio_flush_size:
+            chunk = self.audio_buffer.read(self.bot.audio_flush_size)
+            self.stream.update_audio(chunk)
+            if (
+                self._is_vnc_connected
+                and self.display_window
+                and self.display_window.running
+            ):
+                self.display_window.update_audio(chunk)
+
+    def add_stream_client(self, kind: StreamKind) -> StreamClient:
+        client = self.stream.add_client(kind)
+        if kind != "audio":
+            self.vnc.governor.add_viewer()
+        return client
+
+    def remove_stream_client(self, client: StreamClient):
+        self.stream.remove_client(client)
+        if client.kind != "audio":
+            self.vnc.governor.remove_viewer()
+
+    async def disconnect_vnc(self):
+        self.logger.info("Disconnecting from VNC")
+        if self._is_vnc_connected:
+            self.vnc.remove_event_listener("screen_update")
+            self.vnc.remove_event_listener("ready")
+            self.vnc.remove_event_listener("audio_data")
+            self.vnc.disconnect()
+        self.logger.info("Disconnected from VNC")
+
+    async def shutdown_domain(self):
+        self.logger.info("Shutting down VM")
+        if self._is_vm_running:
+            self.stopping = True
+            await self.disconnect_vnc()
+            await self.virt_worker.call(self.dom.shutdown)
+        self.logger.info("VM is shut down")
+
+    async def start_domain(self) -> bool:
+        # returns whether we started it, false if it was already running
+        self.logger.info("Starting VM")
+        started = False
+        # the supervisor and commands like /reboot may both try to start the VM
+        async with self.power_lock:
+            self.stopping = False
+            if not self._is_vm_running:
+                await self.virt_worker.call(self.dom.create)
+                await self.virt_worker.call(self.vm_state.refresh)
+                await self.connect_vnc(reconnect=True)
+                started = True
+        self.logger.info("VM is started")
+        return started
+
+    async def force_shutdown_domain(self):
+        self.logger.info("Force shutting down VM")
+        if self._is_vm_running:
+            self.stopping = True
+            await self.disconnect_vnc()
+            await self.virt_worker.call(self.dom.destroy)
+            await self.virt_worker.call(self.vm_state.refresh)
+        self.logger.info("VM is force shut down")
+
+    async def start(self):
+        await self.start_domain()
+        await self.connect_vnc()
+        self.supervisor.start()
+
+    def close(self):
+        for preview in list(self.previews.values()):
+            preview.stop()
+        self.stream.close()
+        if self.display_window:
+            self.display_window.close()
+            self.display_window.join()
+        self.screenshots.close()
+
+    async def get_screen_img(self) -> Image.Image | None:
+        self.logger.debug("Getting screen image")
+        if not self._is_vnc_connected:
+            self.logger.warning("VNC is not connected")
+            return None
+
+        return self.vnc.screen
+
+    def reconfigure(self) -> VMReconfiguration:
+        return VMReconfiguration(self)
+
+    async def apply_reconfiguration(self, changes: VMReconfiguration):
+        self.logger.info(f"Applying {changes}")
+        if not self._is_virt_connected:
+            return
+        if changes.vcpus is not None:
+            await self.virt_worker.call(
+                self.dom.setVcpusFlags,
+                changes.vcpus,
+                libvirt.VIR_DOMAIN_AFFECT_CONFIG,
+            )
+        if changes.memory is not None:
+            await self.virt_worker.call(
+                self.dom.setMemoryFlags,
+                changes.memory,
+                libvirt.VIR_DOMAIN_AFFECT_CONFIG | libvirt.VIR_DOMAIN_MEM_MAXIMUM,
+            )
+            await self.virt_worker.call(
+                self.dom.setMemoryFlags,
+                changes.memory,
+                libvirt.VIR_DOMAIN_AFFECT_CONFIG,
+            )
+
+        if not self._is_vm_running or (changes.os is None and not changes.devices):
+            return
+        info = await self.get_current_info()
+        if not info:
+            self.logger.warning("Failed to get VM info")
+            return
+
+        flags = (
+            libvirt.VIR_DOMAIN_AFFECT_CURRENT
+            | libvirt.VIR_DOMAIN_AFFECT_LIVE
+            | libvirt.VIR_DOMAIN_AFFECT_CONFIG
+        )
+        updated = {}
+        os = changes.os.lower() if changes.os else info["os"]
+        if os != info["os"]:
+            metadata = await self.virt_worker.call(self._get_osinfo_metadata)
+            await self.virt_worker.call(
+                self.dom.setMetadata,
+                libvirt.VIR_DOMAIN_METADATA_ELEMENT,
+                set_osinfo_id(metadata, f"http://microsoft.com/win/{os}"),
+                "libosinfo",
+                LIBOSINFO_NS,
+                flags,
+            )
+            updated["os"] = os
+
+        if changes.devices:
+            # one XMLDesc for every device, and only touch disks that change
+            disks = DOMAIN_DISKS.extract(await self.virt_worker.call(self.dom.XMLDesc))
+            for type, path in changes.devices.items():
+                disk = disks[type]
+                if not disk:
+                    continue
+                if path:
+                    if path == "half-life.iso":
+                        path = str(self.bot.image_path / path)
+                    else:
+                        path = str(self.bot.image_path / os / path)
+                if (get_disk_source(disk) or None) == path:
+                    continue
+                await self.virt_worker.call(
+                    self.dom.updateDeviceFlags, set_disk_source(disk, path), flags
+                )
+                updated[type] = path.split("/")[-1] if path else None
+
+        self.vm_state.update(updated)
+
+    def _get_osinfo_metadata(self) -> str:
+        # edit what's there so other libosinfo data survives, runs on the worker
+        try:
+            return self.dom.metadata(libvirt.VIR_DOMAIN_METADATA_ELEMENT, LIBOSINFO_NS)
+        except libvirt.libvirtError as e:
+            if e.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN_METADATA:
+                raise
+            return OSINFO_METADATA
+
+    async def set_vcpus(self, vcpus: int):
+        self.logger.info(f"Setting vCPUs to {vcpus}")
+        await self.reconfigure().set_vcpus(vcpus).commit()
+
+    async def set_memory(self, memory: int):
+        self.logger.info(f"Setting memory to {memory} KB")
+        await self.reconfigure().set_memory(memory).commit()
+
+    async def set_device(
+        self, path: str | None = None, type: Literal["cdrom", "floppy"] = "cdrom"
+    ):
+        self.logger.info(f"Setting {type} to {path}")
+        await self.reconfigure().set_device(path, type).commit()
+
+    async def set_os(self, os: str):
+        self.logger.info(f"Setting OS to {os}")
+        await self.reconfigure().set_os(os).commit()
+
+    async def get_current_info(self) -> VMInfo | None:
+        self.logger.debug("Getting current VM info")
+        # kept up to date by libvirt domain events, no round trip needed
+        return self.vm_state.info
@@ -0,0 +1,118 @@
+import libvirt
+import threading
+from concurrent.futures import Future
+from typing import Literal
+from typings.vminfo import VMInfo
+from utils.domain_xml import DOMAIN_INFO
+from utils.event_listener import EventListener
+from utils.libvirt_worker import LibvirtWorker
+from utils.logger import get_logger
+
+DOMAIN_EVENTS = [
+    libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+    libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_ADDED,
+    libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
+    libvirt.VIR_DOMAIN_EVENT_ID_TRAY_CHANGE,
+    libvirt.VIR_DOMAIN_EVENT_ID_METADATA_CHANGE,
+]
+
+vm_state_events = Literal["lifecycle"]
+
+
+class VMState(EventListener[vm_state_events]):
+    # attach, detach and refresh block on libvirt, run them on the worker
+    worker: LibvirtWorker
+    virt: libvirt.virConnect | None
+    dom: libvirt.virDomain | None
+    info: VMInfo | None
+    active: bool
+    callback_ids: list[int]
+    lock: threading.Lock
+
+    def __init__(self, worker: LibvirtWorker):
+        super().__init__()
+        self.worker = worker
+        self.virt = None
+        self.dom = None
+        self.info = None
+        self.active = False
+        self.callback_ids = []
+        self.lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+
+    def attach(self, virt: libvirt.virConnect, dom: libvirt.virDomain):
+        self.detach()
+        self.virt = virt
+        self.dom = dom
+        for event_id in DOMAIN_EVENTS:
+            try:
+                self.callback_ids.append(
+                    virt.domainEventRegisterAny(
+                        dom, event_id, self._on_domain_event, event_id
+                    )
+                )
+            except libvirt.libvirtError as e:
+                self.logger.warning(
+                    f"Failed to register domain event {event_id}: {e}"
+                )
+        self.refresh()
+
+    def detach(self):
+        if self.virt:
+            for callback_id in self.callback_ids:
+                try:
+                    self.virt.domainEventDeregisterAny(callback_id)
+                except libvirt.libvirtError:
+                    pass
+        self.callback_ids = []
+        self.virt = None
+        self.dom = None
+        self.info = None
+        self.active = False
+
+    def _on_domain_event(self, conn, dom, *args):
+        event_id = args[-1]
+        self.logger.debug(f"Domain event {event_id} received, refreshing state")
+        self.worker.submit(self.refresh).add_done_callback(self._on_refresh_done)
+        if event_id == libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE:
+            event, detail = args[0], args[1]
+            self.dispatch_event_threadsafe("lifecycle", event, detail)
+
+    def _on_refresh_done(self, future: "Future[None]"):
+        if not future.cancelled() and future.exception():
+            self.logger.error(
+                "Failed to refresh VM state, cached info may be stale",
+                exc_info=future.exception(),
+            )
+
+    def refresh(self):
+        with self.lock:
+            if not self.dom:
+                return
+            self.active = self.dom.isActive() == 1
+            self.info = self._read_info(self.dom) if self.active else None
+            self.logger.debug(f"Current VM info: {self.info}")
+
+    def update(self, changes: dict):
+        # write-through for changes the bot made itself
+        with self.lock:
+            if self.info:
+                self.info = {**self.info, **changes}  # type: ignore
+
+    @staticmethod
+    def _read_info(dom: libvirt.virDomain) -> VMInfo:
+        memsize = dom.maxMemory()
+        vcpus = dom.vcpusFlags()
+
+        fields = DOMAIN_INFO.extract(dom.XMLDesc())
+        os = (fields["os"] or "").split("/")[-1]
+        cdrom_path = fields["cdrom"].split("/")[-1] if fields["cdrom"] else None
+        floppy = fields["floppy"].split("/")[-1] if fields["floppy"] else None
+
+        return {
+            "memory": memsize / 1024,
+            "cpu": vcpus,
+            "cdrom": cdrom_path,
+            "floppy": floppy,
+            "os": os,
+        }
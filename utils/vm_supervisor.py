@@ -0,0 +1,126 @@
+import asyncio
+import libvirt
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+from typings.supervisor_stats import SupervisorStats
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from utils.vm_session import VMSession
+
+# the first restart is immediate, repeated ones back off exponentially
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 60.0
+# this many restarts within the window is treated as a crash loop
+CRASH_LOOP_RESTARTS = 5
+CRASH_LOOP_WINDOW = 300.0
+CRASH_LOOP_COOLDOWN = 600.0
+
+RESTART_EVENTS = {
+    libvirt.VIR_DOMAIN_EVENT_STOPPED: "stopped",
+    libvirt.VIR_DOMAIN_EVENT_SHUTDOWN: "shut down",
+    libvirt.VIR_DOMAIN_EVENT_CRASHED: "crashed",
+}
+
+
+class VMSupervisor:
+    restart_times: deque[float]
+    task: asyncio.Task | None
+    restarts: int
+    crash_loops: int
+    last_restart_time: float | None
+    total_restart_time: float
+
+    def __init__(self, session: "VMSession"):
+        self.session = session
+        self.restart_times = deque()
+        self.task = None
+        self.restarts = 0
+        self.crash_loops = 0
+        self.last_restart_time = None
+        self.total_restart_time = 0.0
+        self.logger = get_logger(self.__class__.__name__)
+
+    @property
+    def stats(self) -> SupervisorStats:
+        return {
+            "restarts": self.restarts,
+            "crash_loops": self.crash_loops,
+            "last_restart_time": self.last_restart_time,
+            "average_restart_time": (
+                self.total_restart_time / self.restarts if self.restarts else None
+            ),
+        }
+
+    def start(self):
+        self.logger.info("VM supervisor started")
+        self.session.vm_state.add_event_listener(
+            "lifecycle", self._on_lifecycle, asyncio.get_running_loop()
+        )
+
+    def stop(self):
+        self.session.vm_state.remove_event_listener("lifecycle")
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.logger.info("VM supervisor stopped")
+
+    async def _on_lifecycle(self, event: int, detail: int):
+        reason = RESTART_EVENTS.get(event)
+        if not reason:
+            return
+        if event != libvirt.VIR_DOMAIN_EVENT_CRASHED and self.session.stopping:
+            # /reboot and friends, whoever stopped it starts it again
+            self.logger.debug(f"VM {reason} by the bot, not restarting")
+            return
+        self.logger.warning(f"VM {reason} (detail {detail}), restarting")
+        if event == libvirt.VIR_DOMAIN_EVENT_CRASHED and self.session._is_vm_running:
+            # a preserved crashed domain is still active, get rid of it first
+            await self.session.force_shutdown_domain()
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self._restart())
+
+    def _next_delay(self) -> float:
+        now = time.monotonic()
+        while self.restart_times and now - self.restart_times[0] > CRASH_LOOP_WINDOW:
+            self.restart_times.popleft()
+
+        if len(self.restart_times) >= CRASH_LOOP_RESTARTS:
+            self.crash_loops += 1
+            self.logger.error(
+                f"VM restarted {len(self.restart_times)} times in "
+                f"{CRASH_LOOP_WINDOW:.0f}s, waiting {CRASH_LOOP_COOLDOWN:.0f}s"
+            )
+            self.restart_times.clear()
+            return CRASH_LOOP_COOLDOWN
+        if not self.restart_times:
+            return 0
+        return min(
+            RESTART_BACKOFF * 2 ** (len(self.restart_times) - 1), MAX_RESTART_BACKOFF
+        )
+
+    async def _restart(self):
+        # refresh first, the event may be stale by the time we get here
+        await self.session.virt_worker.call(self.session.vm_state.refresh)
+        while self.session._is_virt_connected and not self.session._is_vm_running:
+            delay = self._next_delay()
+            if delay:
+                self.logger.info(f"Restarting VM in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+            start = time.monotonic()
+            try:
+                if not await self.session.start_domain():
+                    # someone else started it while we were waiting
+                    break
+            except Exception as e:
+                self.logger.exception(e)
+            self.restart_times.append(time.monotonic())
+
+            if self.session._is_vm_running:
+                elapsed = time.monotonic() - start
+                self.restarts += 1
+                self.last_restart_time = elapsed
+                self.total_restart_time += elapsed
+                self.logger.info(f"VM restarted in {elapsed:.2f}s")
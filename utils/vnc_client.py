@@ -1,45 +1,190 @@
 import asyncio
+import inspect
+import struct
 import threading
 import traceback
-from typing import Any, Callable, Generic, Literal, TypeVar
-from collections.abc import Coroutine
+from typing import Any, Literal, TypeVar
+from collections.abc import Callable, Coroutine
 from vncdotool.client import VNCDoToolClient
 from PIL.Image import Image
+from utils.event_listener import EventListener
+from utils.framebuffer import Framebuffer, Move, Rect
+from utils.input_queue import InputQueue
+from utils.keystrokes import KeyProgram
+from utils.logger import get_logger
+from utils.pixel_format import PIXEL_FORMATS, PixelExpander, PixelFormatName
+from utils.pointer_path import Point
+from utils.refresh_governor import RefreshGovernor
+from utils.vnc_encodings import (
+    DECODERS,
+    DEFAULT_ENCODINGS,
+    ENCODINGS,
+    CountingReader,
+    DecodeTimer,
+)
+from typings.encoding_stats import EncodingStats
 
 FPS = 60
+VNC_SOCKET = "/tmp/umw-vnc.sock"
 
-Events = TypeVar("Events", bound=str)
+T = TypeVar("T")
 
 
-class EventListener(Generic[Events]):
-    event_listeners: dict[Events, Callable[..., Coroutine[Any, Any, Any]]]
+def merge_screen_updates(pending: tuple, latest: tuple) -> tuple:
+    # keep the damage of superseded updates so consumers don't miss any region
+    pending_rects, _ = pending
+    rects, generation = latest
+    return pending_rects + rects, generation
 
-    def __init__(self):
-        self.event_listeners = {}
 
-    def add_event_listener(
-        self, event: Events, callback: Callable[..., Coroutine[Any, Any, Any]]
-    ):
-        self.event_listeners[event] = callback
-
-    def remove_event_listener(self, event: Events):
-        self.event_listeners.pop(event, None)
-
-    async def dispatch_event(self, event: Events, *args):
-        if event in self.event_listeners:
-            asyncio.create_task(self.event_listeners[event](*args))
+def intersects(a: Rect, b: Rect) -> bool:
+    return (
+        a.x < b.x + b.width
+        and b.x < a.x + a.width
+        and a.y < b.y + b.height
+        and b.y < a.y + a.height
+    )
 
 
 vnc_events = Literal["ready", "audio_start", "audio_stop", "audio_data"]
 
 
 class CustomVNCClient(EventListener[vnc_events], VNCDoToolClient):
-    def __init__(self):
+    damage: list[Rect]
+    moves: list[Move]
+    expander: PixelExpander | None
+    preferred_encodings: list[str]
+    decode_timer: DecodeTimer
+
+    def __init__(
+        self,
+        pixel_format: PixelFormatName | None = None,
+        encodings: list[str] | None = None,
+    ):
         super().__init__()
         VNCDoToolClient.__init__(self)
+        self.damage = []
+        self.moves = []
+        format = PIXEL_FORMATS.get(pixel_format) if pixel_format else None
+        self.expander = PixelExpander(format) if format else None
+        # only ask for what our vncdotool can actually decode
+        self.preferred_encodings = [
+            name
+            for name in encodings or DEFAULT_ENCODINGS
+            if any(hasattr(self, decoder) for decoder in DECODERS[name])
+        ]
+        self.decode_timer = DecodeTimer(self._received)
+        self.decode_timer.install(self)
+
+    def _received(self) -> int:
+        reader = getattr(self, "reader", None)
+        return reader.received if isinstance(reader, CountingReader) else 0
+
+    def setEncodings(self, requested: list[int]):
+        # vncdotool only ever asks for raw, keep its pseudo encodings (cursor,
+        # desktop size, audio...) and put our preference in front of them
+        encodings = [ENCODINGS[name] for name in self.preferred_encodings]
+        pseudo = [
+            encoding for encoding in requested if encoding not in ENCODINGS.values()
+        ]
+        return super().setEncodings(encodings + pseudo)
+
+    def updateRectangle(self, x: int, y: int, width: int, height: int, data: bytes):
+        self.damage.append(Rect(x, y, width, height))
+        if self.expander:
+            data = self.expander.expand(data)
+        return super().updateRectangle(x, y, width, height, data)
+
+    def updateCursor(
+        self, x: int, y: int, width: int, height: int, image: bytes, mask: bytes
+    ):
+        # the cursor image comes in the negotiated format too, expects RGBX
+        if self.expander:
+            image = self.expander.expand(image, padded=True)
+        return super().updateCursor(x, y, width, height, image, mask)
+
+    def copyRectangle(
+        self, srcx: int, srcy: int, x: int, y: int, width: int, height: int
+    ):
+        rect = Rect(x, y, width, height)
+        source = Rect(srcx, srcy, width, height)
+        if any(intersects(source, damaged) for damaged in self.damage):
+            # the framebuffer only has the previous frame to copy from, if this
+            # update already painted over the source send the pixels instead
+            self.damage.append(rect)
+        else:
+            self.moves.append(Move(srcx, srcy, rect))
+        return super().copyRectangle(srcx, srcy, x, y, width, height)
+
+    def pop_damage(self) -> tuple[list[Rect], list[Move]]:
+        damage, self.damage = self.damage, []
+        moves, self.moves = self.moves, []
+        return damage, moves
+
+    async def sendKeyEvents(
+        self, events: KeyProgram, batch_size: int, delay: float
+    ):
+        # writes the RFB KeyEvent messages ourselves, so a whole batch goes out
+        # in a single write instead of one write and one round trip per key
+        for i in range(0, len(events), batch_size):
+            self.writer.write(
+                b"".join(
+                    struct.pack("!BBxxI", 4, down, keysym)
+                    for keysym, down in events[i : i + batch_size]
+                )
+            )
+            await self.writer.drain()
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def sendPointerEvents(
+        self, points: tuple[Point, ...], duration: float, button: int = 0
+    ):
+        # spreads the points over the duration, every point that's due by the
+        # time we wake up goes out in the same write. with a button the whole
+        # path is a drag, pressed at the current position and released at the end
+        loop = asyncio.get_running_loop()
+        pressed = self.buttons | (1 << (button - 1)) if button else self.buttons
+        if button:
+            points = ((self.x, self.y), *points)
+        if not points:
+            return
+        start = loop.time()
+        sent = 0
+        while sent < len(points):
+            elapsed = loop.time() - start
+            due = (
+                len(points)
+                if duration <= 0
+                else min(len(points), int(elapsed / duration * len(points)) + 1)
+            )
+            self.writer.write(
+                b"".join(
+                    struct.pack("!BBHH", 5, pressed, max(0, x), max(0, y))
+                    for x, y in points[sent:due]
+                )
+            )
+            sent = due
+            await self.writer.drain()
+            if sent < len(points):
+                await asyncio.sleep(start + sent / len(points) * duration - loop.time())
+
+        self.x, self.y = points[-1]
+        if button:
+            self.writer.write(
+                struct.pack("!BBHH", 5, self.buttons, max(0, self.x), max(0, self.y))
+            )
+            await self.writer.drain()
 
     async def vncConnectionMade(self):
         await super().vncConnectionMade()
+        if self.expander:
+            # fewer bytes per pixel on the wire, updateRectangle expands them
+            # back to RGB before the screen sees them
+            result = self.setPixelFormat(**self.expander.format._asdict())
+            if inspect.isawaitable(result):
+                await result
+            self.image_mode = "RGB"
         await self.dispatch_event("ready")
 
     async def audio_stream_begin(self) -> None:
@@ -56,14 +201,32 @@ class VNCClient(
     EventListener[Literal[vnc_events, "disconnect", "screen_update"]], threading.Thread
 ):
     vnc: VNCDoToolClient
+    framebuffer: Framebuffer
+    socket_path: str
+    governor: RefreshGovernor
+    input_queue: InputQueue
     is_ready: asyncio.Event
     loop: asyncio.AbstractEventLoop
 
-    def __init__(self):
+    def __init__(
+        self,
+        framebuffer: Framebuffer,
+        fps: int = FPS,
+        socket_path: str = VNC_SOCKET,
+        pixel_format: PixelFormatName | None = None,
+        encodings: list[str] | None = None,
+    ):
         super().__init__()
         threading.Thread.__init__(self, daemon=True)
-        self.vnc = CustomVNCClient()
+        self.vnc = CustomVNCClient(pixel_format, encodings)
+        self.framebuffer = framebuffer
+        self.socket_path = socket_path
+        self.governor = RefreshGovernor(fps)
+        self.input_queue = InputQueue()
         self.is_ready = asyncio.Event()
+        # created up front so other threads can submit work before run() starts
+        self.loop = asyncio.new_event_loop()
+        self.logger = get_logger(self.__class__.__name__)
         self.vnc.add_event_listener("ready", self.on_ready)
         self.vnc.add_event_listener("audio_start", self._on_audio_start)
         self.vnc.add_event_listener("audio_stop", self._on_audio_stop)
@@ -81,6 +244,10 @@ class VNCClient(
     def y(self) -> int:
         return self.vnc.y
 
+    @property
+    def encoding_stats(self) -> dict[str, EncodingStats]:
+        return self.vnc.decode_timer.stats
+
     @property
     def is_connected(self) -> bool:
         return bool(
@@ -91,41 +258,102 @@ class VNCClient(
         )
 
     async def connect_vnc(self):
-        reader, writer = await asyncio.open_unix_connection("/tmp/umw-vnc.sock")
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
         # reader, writer = await asyncio.open_connection("localhost", 5900)
-        await self.vnc.connect(reader, writer)
+        # counts the bytes each encoding costs us, see DecodeTimer
+        await self.vnc.connect(CountingReader(reader), writer)  # type: ignore
         await self.vnc_refresh_loop()
 
+    def _submit(self, coro: Coroutine[Any, Any, T]) -> "asyncio.Future[T]":
+        # runs the coroutine on the VNC loop and hands back a future for the
+        # calling thread's loop, so callers can await the result if they care
+        if not self.loop.is_running():
+            coro.close()
+            future = asyncio.get_running_loop().create_future()
+            future.set_exception(ConnectionError("VNC event loop is not running"))
+            return future
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def _log_failure(self, future: "asyncio.Future[Any]"):
+        # retrieves the exception of calls nobody awaits, a connection that's
+        # already gone is expected on reconnects
+        if not future.cancelled() and future.exception():
+            self.logger.debug(f"VNC request failed: {future.exception()}")
+
     def disconnect(self):
-        asyncio.create_task(self.vnc.disconnect())
-        self.vnc.updateCommited.set()
+        self._submit(self.vnc.disconnect()).add_done_callback(self._log_failure)
+        self.loop.call_soon_threadsafe(self.vnc.updateCommited.set)
+
+    def _input(
+        self,
+        user: int | None,
+        kind: str,
+        func: Callable[..., Coroutine[Any, Any, Any]],
+        *args,
+    ) -> "asyncio.Future[None]":
+        # every input goes through the queue so events from concurrent commands
+        # reach the server in order, raises InputQueueFull when it's backed up
+        self.governor.wake()
+        return self._submit(self.input_queue.submit(user, kind, func, *args))
+
+    def sendKeyEvents(
+        self,
+        events: KeyProgram,
+        batch_size: int,
+        delay: float,
+        user: int | None = None,
+    ) -> "asyncio.Future[None]":
+        return self._input(
+            user, "sendKeyEvents", self.vnc.sendKeyEvents, events, batch_size, delay
+        )
 
-    def keyDown(self, key: str):
-        asyncio.create_task(self.vnc.keyDown(key))
+    def movePath(
+        self,
+        points: tuple[Point, ...],
+        duration: float,
+        button: int = 0,
+        user: int | None = None,
+    ) -> "asyncio.Future[None]":
+        return self._input(
+            user, "movePath", self.vnc.sendPointerEvents, points, duration, button
+        )
+
+    def keyDown(self, key: str, user: int | None = None) -> "asyncio.Future[None]":
+        return self._input(user, "keyDown", self.vnc.keyDown, key)
 
-    def keyUp(self, key: str):
-        asyncio.create_task(self.vnc.keyUp(key))
+    def keyUp(self, key: str, user: int | None = None) -> "asyncio.Future[None]":
+        return self._input(user, "keyUp", self.vnc.keyUp, key)
 
-    def mouseMove(self, x: int, y: int):
-        asyncio.create_task(self.vnc.mouseMove(x, y))
+    def mouseMove(
+        self, x: int, y: int, user: int | None = None
+    ) -> "asyncio.Future[None]":
+        return self._input(user, "mouseMove", self.vnc.mouseMove, x, y)
 
-    def mouseDrag(self, x: int, y: int, step: int):
-        asyncio.create_task(self.vnc.mouseDrag(x, y, step))
+    def mouseDrag(
+        self, x: int, y: int, step: int, user: int | None = None
+    ) -> "asyncio.Future[None]":
+        return self._input(user, "mouseDrag", self.vnc.mouseDrag, x, y, step)
 
-    def mouseDown(self, button: int):
-        asyncio.create_task(self.vnc.mouseDown(button))
+    def mouseDown(self, button: int, user: int | None = None) -> "asyncio.Future[None]":
+        return self._input(user, "mouseDown", self.vnc.mouseDown, button)
 
-    def mouseUp(self, button: int):
-        asyncio.create_task(self.vnc.mouseUp(button))
+    def mouseUp(self, button: int, user: int | None = None) -> "asyncio.Future[None]":
+        return self._input(user, "mouseUp", self.vnc.mouseUp, button)
 
-    def mousePress(self, button: int):
-        asyncio.create_task(self.vnc.mousePress(button))
+    def mousePress(
+        self, button: int, user: int | None = None
+    ) -> "asyncio.Future[None]":
+        return self._input(user, "mousePress", self.vnc.mousePress, button)
 
-    def audioStreamBeginRequest(self):
-        asyncio.create_task(self.vnc.audioStreamBeginRequest())
+    def audioStreamBeginRequest(self) -> "asyncio.Future[None]":
+        future = self._submit(self.vnc.audioStreamBeginRequest())
+        future.add_done_callback(self._log_failure)
+        return future
 
-    def audioStreamStopRequest(self):
-        asyncio.create_task(self.vnc.audioStreamStopRequest())
+    def audioStreamStopRequest(self) -> "asyncio.Future[None]":
+        future = self._submit(self.vnc.audioStreamStopRequest())
+        future.add_done_callback(self._log_failure)
+        return future
 
     async def on_ready(self):
         await self.dispatch_event("ready")
@@ -134,16 +362,22 @@ class VNCClient(
     async def vnc_refresh_loop(self):
         await self.is_ready.wait()
         while self.is_connected:
+            await self.governor.wait()
             await self.vnc.refreshScreen(incremental=True)
-            asyncio.create_task(self._on_screen_update())
+            rects, moves = self.vnc.pop_damage()
+            changed = rects + [move.rect for move in moves]
+            self.governor.record(bool(changed))
+            if changed and self.vnc.screen:
+                generation = self.framebuffer.update(self.vnc.screen, rects, moves)
+                await self.dispatch_coalesced(
+                    "screen_update", changed, generation, merge=merge_screen_updates
+                )
 
         # when it reaches here, it means the connection is closed
+        await self.input_queue.close(ConnectionError("VNC connection closed"))
         await self.dispatch_event("disconnect")
         self.is_ready.clear()
 
-    async def _on_screen_update(self) -> None:
-        await self.dispatch_event("screen_update", self.vnc.screen)
-
     async def _on_audio_start(self):
         await self.dispatch_event("audio_start")
 
@@ -154,10 +388,12 @@ class VNCClient(
         await self.dispatch_event("audio_data", size, data)
 
     def run(self) -> None:
-        self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
         try:
             self.loop.run_until_complete(self.connect_vnc())
         except Exception as e:
             traceback.print_exc()
+            self.loop.run_until_complete(
+                self.input_queue.close(ConnectionError("VNC connection closed"))
+            )
             self.loop.run_until_complete(self.dispatch_event("disconnect"))
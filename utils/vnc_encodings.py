@@ -0,0 +1,154 @@
+import asyncio
+import inspect
+import time
+from collections.abc import Callable
+from typing import Any
+from typings.encoding_stats import EncodingStats
+
+# RFB encoding numbers, see RFC 6143 section 7.7
+ENCODINGS = {
+    "raw": 0,
+    "copyrect": 1,
+    "rre": 2,
+    "corre": 4,
+    "hextile": 5,
+    "zlib": 6,
+    "tight": 7,
+    "zrle": 16,
+}
+
+# over a local socket bandwidth is cheap, CopyRect and ZRLE still save decoding
+# whole rectangles when windows move or the screen scrolls
+DEFAULT_ENCODINGS = ["copyrect", "zrle", "hextile", "raw"]
+
+# the vncdotool methods that decode each encoding, an encoding is only offered
+# to the server when one of them exists
+DECODERS = {
+    "raw": ["_handleDecodeRAW"],
+    "copyrect": ["_handleDecodeCopyrect"],
+    "rre": ["_handleDecodeRRE", "_handleRRESubRectangles"],
+    "corre": ["_handleDecodeCORRE", "_handleDecodeCORRERectangles"],
+    "hextile": [
+        "_handleDecodeHextile",
+        "_doNextHextileSubrect",
+        "_handleDecodeHextileRAW",
+        "_handleDecodeHextileSubrectsColoured",
+        "_handleDecodeHextileSubrectsFG",
+    ],
+    "zlib": ["_handleDecodeZlib"],
+    "tight": ["_handleDecodeTight"],
+    "zrle": ["_handleDecodeZRLE"],
+}
+
+
+def parse_encodings(value: str) -> list[str]:
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENCODINGS]
+    if unknown:
+        raise ValueError(f"Unknown VNC encodings: {', '.join(unknown)}")
+    return names
+
+
+class CountingReader:
+    # wraps the connection's StreamReader to count the bytes we receive
+    reader: asyncio.StreamReader
+    received: int
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.received = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.reader, name)
+
+    async def read(self, n: int = -1) -> bytes:
+        data = await self.reader.read(n)
+        self.received += len(data)
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        data = await self.reader.readexactly(n)
+        self.received += len(data)
+        return data
+
+    async def readuntil(self, separator: bytes = b"\n") -> bytes:
+        data = await self.reader.readuntil(separator)
+        self.received += len(data)
+        return data
+
+    async def readline(self) -> bytes:
+        data = await self.reader.readline()
+        self.received += len(data)
+        return data
+
+
+class DecodeTimer:
+    # wraps the decode handlers of a client to count rectangles, bytes and time
+    # per encoding. works for both the sync expect() style handlers, which get
+    # their bytes as arguments, and async ones that read the socket themselves
+    stats: dict[str, EncodingStats]
+    decoding: bool
+
+    def __init__(self, received: Callable[[], int]):
+        self.received = received
+        self.stats = {}
+        self.decoding = False
+
+    def install(self, client: Any):
+        for encoding, names in DECODERS.items():
+            for index, name in enumerate(names):
+                handler = getattr(client, name, None)
+                if handler:
+                    # only the first handler of an encoding starts a rectangle
+                    setattr(client, name, self.wrap(encoding, handler, index == 0))
+
+    def wrap(
+        self, encoding: str, handler: Callable[..., Any], first: bool
+    ) -> Callable[..., Any]:
+        def wrapper(*args):
+            # hextile and friends call their handlers from each other
+            if self.decoding:
+                return handler(*args)
+            self.decoding = True
+            start = time.perf_counter()
+            received = self.received()
+            size = sum(
+                len(arg) for arg in args if isinstance(arg, (bytes, bytearray))
+            )
+            try:
+                result = handler(*args)
+            except BaseException:
+                self.decoding = False
+                raise
+            if inspect.isawaitable(result):
+                return self._finish(encoding, first, result, start, received, size)
+            self._record(encoding, first, start, received, size)
+            return result
+
+        return wrapper
+
+    async def _finish(
+        self,
+        encoding: str,
+        first: bool,
+        result: Any,
+        start: float,
+        received: int,
+        size: int,
+    ) -> Any:
+        try:
+            return await result
+        finally:
+            self._record(encoding, first, start, received, size)
+
+    def _record(
+        self, encoding: str, first: bool, start: float, received: int, size: int
+    ):
+        self.decoding = False
+        stats = self.stats.setdefault(
+            encoding, {"rects": 0, "bytes": 0, "decode_time": 0.0}
+        )
+        if first:
+            stats["rects"] += 1
+        stats["bytes"] += size + self.received() - received
+        stats["decode_time"] += time.perf_counter() - start